@@ -0,0 +1,85 @@
+"""
+Embedding time of report entries: one request per incident vs batched, concurrent requests,
+with a cold and a warm embedding cache.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_embeddings --incidents 100,1000 --latency 0.1
+
+Runs against the local embedding backend (llm.backends) with simulated latency
+and failures. The per-incident mode is the former report_generator loop
+(`embed_query` per incident); the batched modes are llm.embeddings.embed_texts,
+first with an empty embedding cache (a temporary file), then again with the
+cache filled. Inputs are report texts built from incidents of the sample logs in
+data/, repeated as needed, so the cold run also benefits from deduplication.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incidents", default="100,1000")
+    parser.add_argument("--latency", type=float, default=0.1, help="Simulated seconds per embedding request")
+    parser.add_argument("--failure-rate", type=float, default=0.02, help="Fraction of requests failing with 429/5xx")
+    parser.add_argument("--batch-tokens", type=int, default=20000)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    args = parser.parse_args()
+
+    # Backends and limits are read at import time
+    os.environ.update({
+        "LLM_BACKEND": "local",
+        "LOCAL_EMBEDDING_LATENCY": str(args.latency),
+        "LOCAL_LLM_FAILURE_RATE": str(args.failure_rate),
+        "LOCAL_LLM_RETRY_AFTER": "0.2",
+        "EMBEDDING_BATCH_TOKENS": str(args.batch_tokens),
+        "EMBEDDING_MAX_IN_FLIGHT": str(args.max_in_flight),
+        "EMBEDDING_CACHE_PATH": os.path.join(tempfile.mkdtemp(), "embedding_cache.sqlite"),
+    })
+    from ingestion.stream import DATA_DIR, iter_log_chunks
+    from llm.backends import local_classification
+    from graph.nodes.incident_manager import build_incident
+    import llm.embeddings as batched
+
+    logs = [log for chunk in iter_log_chunks(DATA_DIR) for log in chunk]
+    texts_all = []
+    for i in range(max(int(x) for x in args.incidents.split(","))):
+        incident = build_incident(logs[i % len(logs)], local_classification(logs[i % len(logs)].to_dict()))
+        texts_all.append(" ".join(str(v) for k, v in incident.items() if k not in {"incident_id", "detected_at"} and v))
+
+    print(f"local embeddings: {args.latency}s per request, {args.failure_rate:.0%} failures; "
+          f"batches of {args.batch_tokens} tokens, {args.max_in_flight} in flight\n")
+    rows = []
+    for n in [int(x) for x in args.incidents.split(",")]:
+        texts = texts_all[:n]
+
+        started = time.perf_counter()
+        vectors = []
+        for text in texts:
+            try:
+                vectors.append(batched.embeddings.embed_query(text))
+            except Exception:
+                vectors.append([])
+        rows.append((n, "per incident", n, time.perf_counter() - started, sum(1 for v in vectors if not v)))
+
+        for label in ("batched, cold", "batched, warm"):
+            if label.endswith("cold"):
+                # Each size starts from an empty cache
+                cache = batched.get_embedding_cache()
+                with cache.conn:
+                    cache.conn.execute("DELETE FROM vectors")
+                cache.memory.clear()
+            started = time.perf_counter()
+            requests = batched.stats.requests
+            vectors = batched.embed_texts(texts)
+            rows.append((n, label, batched.stats.requests - requests, time.perf_counter() - started,
+                         sum(1 for v in vectors if v is None)))
+
+    print(f"\n{'incidents':>9} {'mode':<14} {'requests':>8} {'seconds':>8} {'missing':>8}")
+    for n, label, requests, elapsed, missing in rows:
+        print(f"{n:>9} {label:<14} {requests:>8} {elapsed:>8.1f} {missing:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Feature extraction throughput: legacy per-row implementation vs vectorized ml.model.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_extract_features --sizes 10000,1000000,10000000
+
+The legacy loop is only timed up to --legacy-max rows (it runs at a few thousand
+rows/sec, so 10M rows would take hours); larger sizes report the vectorized paths only.
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+import pandas as pd
+from ingestion.record import LogRecord
+from ml.model import load_model_and_encoders, extract_features
+
+EVENTS = ["NORMAL"] * 8 + ["FAILED_LOGIN", "UNKNOWN_ACTIVITY", "MALICIOUS_TRANSFER", "NEW_EVENT"]
+ENDPOINTS = ["/login", "/card/activation", "/plp/data/export", "/plp/payment/generate"]
+
+
+def legacy_extract_features(logs, event_encoder):
+    # Pre-vectorization implementation, kept verbatim for comparison
+    rows = []
+    for log in logs:
+        ts = log.get("timestamp")
+        try:
+            hour = datetime.strptime(ts, "%Y-%m-%d %H:%M:%S").hour
+        except:
+            hour = 0
+
+        event = log.get("event", "UNKNOWN_ACTIVITY")
+
+        event_enc = event_encoder.transform([event])[0] if event in event_encoder.classes_ else -1
+
+        rows.append({
+            "hour": hour,
+            "event_encoded": event_enc
+        })
+
+    return pd.DataFrame(rows)
+
+
+def make_raw_logs(n, seed=42):
+    rng = random.Random(seed)
+    return [{
+        "timestamp": f"2025-06-30 {rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}",
+        "user": f"user{rng.randrange(5000)}",
+        "ip": f"10.0.{rng.randrange(256)}.{rng.randrange(256)}",
+        "endpoint": rng.choice(ENDPOINTS),
+        "action": "ACCESS",
+        "event": rng.choice(EVENTS),
+    } for _ in range(n)]
+
+
+def rate(n, seconds):
+    return f"{n / seconds:>14,.0f} rows/s ({seconds:.3f}s)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,1000000,10000000")
+    parser.add_argument("--legacy-max", type=int, default=100000)
+    args = parser.parse_args()
+
+    _, event_encoder = load_model_and_encoders()
+
+    for n in (int(s) for s in args.sizes.split(",")):
+        raw = make_raw_logs(n)
+        print(f"\n{n:,} logs")
+
+        if n <= args.legacy_max:
+            start = time.perf_counter()
+            legacy = legacy_extract_features(raw, event_encoder)
+            print(f"  legacy per-row loop     {rate(n, time.perf_counter() - start)}")
+        else:
+            legacy = None
+            print("  legacy per-row loop     skipped (--legacy-max)")
+
+        start = time.perf_counter()
+        records = [LogRecord.from_raw(r) for r in raw]
+        print(f"  LogRecord ingestion     {rate(n, time.perf_counter() - start)}  (once per log, at load)")
+        del raw
+
+        start = time.perf_counter()
+        features = extract_features(records, event_encoder)
+        print(f"  vectorized (records)    {rate(n, time.perf_counter() - start)}")
+
+        frame = pd.DataFrame({"ts": [r.ts for r in records], "event": [r.event for r in records]})
+        del records
+        start = time.perf_counter()
+        extract_features(frame, event_encoder)
+        print(f"  vectorized (columnar)   {rate(n, time.perf_counter() - start)}")
+
+        if legacy is not None:
+            assert (legacy.to_numpy() == features.to_numpy()).all(), "vectorized features differ from legacy"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Speedup of the partitioned (map-reduce) graph over the single-invocation graph.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_partitioned --logs 20000 --partitions 8 --workers 8 --executors thread,process
+
+Runs against the local LLM backend (llm.backends) with simulated latency, the LLM
+cache off, on synthetic logs. Reports (no MongoDB) and audit entries go to a
+temporary directory, not reports/ and the audit trail.
+Each configuration compiles its graph once and is timed over a full invoke.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logs", type=int, default=20000)
+    parser.add_argument("--partitions", type=int, default=8, help="User-hash partitions")
+    parser.add_argument("--by", default="user", choices=["user", "time", "file"])
+    parser.add_argument("--executors", default="thread,process")
+    parser.add_argument("--workers", type=int, default=8, help="Partitions processed at once")
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated seconds per LLM call")
+    parser.add_argument("--seconds-per-token", type=float, default=0.0005, help="Simulated seconds per reply token")
+    args = parser.parse_args()
+
+    # Backends, limits and output locations are read at import time
+    scratch = tempfile.mkdtemp(prefix="bench_partitioned_")
+    os.environ.update({
+        "REPORTS_DIR": os.path.join(scratch, "reports"),
+        "AUDIT_LOG_FILE": os.path.join(scratch, "audit_log.jsonl"),
+        "LLM_BACKEND": "local",
+        "LLM_CACHE_ENABLED": "0",
+        "LOCAL_LLM_LATENCY": str(args.latency),
+        "LOCAL_LLM_SECONDS_PER_TOKEN": str(args.seconds_per_token),
+        "LLM_RPM": "5000",
+        "LLM_TPM": "2000000",
+        "REPORT_TO_MONGO": "0",
+        "TQDM_DISABLE": "1",
+        "PARTITION_BY": args.by,
+        "PARTITION_COUNT": str(args.partitions),
+        "PARTITION_WORKERS": str(args.workers),
+    })
+    from benchmarks.bench_extract_features import make_raw_logs
+    from ingestion.record import LogRecord
+    from state_schema import State
+    from graph.flow import build_graph, build_partitioned_graph
+    import graph.partitioned as partitioned
+
+    logs = [LogRecord.from_raw(raw) for raw in make_raw_logs(args.logs)]
+
+    def run(flow, config=None):
+        state = State(logs=list(logs), accessed_by="l3_analyst@bank.co.in", user_role="L3")
+        started = time.perf_counter()
+        final = flow.invoke(state, config=config)
+        return time.perf_counter() - started, len(final["logs"])
+
+    rows = [("single invocation", *run(build_graph()))]
+    partitioned_flow = build_partitioned_graph()
+    for executor in args.executors.split(","):
+        partitioned.PARTITION_EXECUTOR = executor
+        # Pool start-up is not part of the steady-state comparison
+        partitioned.get_partition_executor(executor)
+        rows.append((f"partitioned, {executor}", *run(partitioned_flow, {"max_concurrency": args.workers})))
+    partitioned.shutdown_partition_executor()
+
+    baseline = rows[0][1]
+    print(f"\n{args.logs} logs, {args.partitions} partitions by {args.by}, {args.workers} workers, "
+          f"local LLM {args.latency}s + {args.seconds_per_token}s/token per call")
+    print(f"{'flow':<24} {'seconds':>8} {'incidents':>9} {'speedup':>8}")
+    for label, seconds, incidents in rows:
+        print(f"{label:<24} {seconds:>8.1f} {incidents:>9} {baseline / seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Tokens per incident for the LLM prompts: JSON payloads vs the compact table codec.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_prompt_codec --batch-size 10
+
+Uses the sample logs in data/. Input is measured on the real payloads of both
+LLM nodes. Output is measured on replies with the same canned summary/impact
+text, so the difference is the fields the model no longer echoes back. Latency
+and cost are estimates from --output-tps and the per-million-token prices.
+"""
+import argparse
+import json
+from ingestion.stream import DATA_DIR, iter_log_chunks
+from llm.batching import count_tokens, _encoding
+from llm.codec import encode_table
+from graph.nodes.incident_manager import build_incident
+
+SUMMARY = "Multiple failed login attempts from a single IP within a short window indicate a likely brute-force attack."
+IMPACT = "Potential account takeover and unauthorized access to customer data."
+ACTIONS = ["Block the source IP at the WAF", "Force a password reset", "Enable MFA for the account",
+           "Review recent sessions for the user"]
+WHY = "Repeated authentication failures from one IP match a brute-force pattern with high account-takeover risk."
+
+INCIDENT_FIELDS = ["threat_type", "affected_user", "source_ip", "system", "endpoint", "detected_at",
+                   "summary", "impact", "risk_score", "event_type"]
+
+
+def legacy_classification(log):
+    # Reply object of the original prompt: every field echoed per log
+    return {"threat_type": "brute_force", "affected_user": log.user, "source_ip": log.ip,
+            "affected_system": log.system or "mobile_app", "endpoint": log.endpoint, "timestamp": log.timestamp,
+            "summary": SUMMARY, "impact": IMPACT, "risk_score": 7, "event_type": log.event}
+
+
+def compact_classification(ref):
+    return {"ref": ref, "threat_type": "brute_force", "affected_system": "mobile_app",
+            "summary": SUMMARY, "impact": IMPACT, "risk_score": 7}
+
+
+def measure(batches, encode_input, encode_output, model):
+    tokens_in = tokens_out = 0
+    for batch in batches:
+        tokens_in += count_tokens(encode_input(batch), model)
+        tokens_out += count_tokens(encode_output(batch), model)
+    return tokens_in, tokens_out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=str(DATA_DIR))
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--output-tps", type=float, default=80.0, help="Model output tokens per second")
+    parser.add_argument("--input-price", type=float, default=2.50, help="USD per 1M input tokens")
+    parser.add_argument("--output-price", type=float, default=10.00, help="USD per 1M output tokens")
+    args = parser.parse_args()
+
+    logs = [log for chunk in iter_log_chunks(args.data_dir) for log in chunk]
+    n = len(logs)
+    batches = [logs[i:i + args.batch_size] for i in range(0, n, args.batch_size)]
+    exact = _encoding("gpt-4o") is not None
+    print(f"{n} logs from {args.data_dir}, batches of {args.batch_size}, "
+          f"{'tiktoken' if exact else 'estimated (tokenizer unavailable)'} token counts\n")
+
+    legacy = measure(
+        batches,
+        lambda b: json.dumps([log.to_dict() for log in b]),
+        lambda b: json.dumps([legacy_classification(log) for log in b]),
+        "gpt-4o",
+    )
+    compact = measure(
+        batches,
+        lambda b: encode_table([log.to_dict() for log in b]),
+        lambda b: json.dumps({"incidents": [compact_classification(i) for i in range(len(b))]}),
+        "gpt-4o",
+    )
+
+    incidents = [build_incident(log, compact_classification(0)) for log in logs]
+    for incident in incidents:
+        incident["incident_id"] = "INC0000ABCD"
+    incident_batches = [incidents[i:i + args.batch_size] for i in range(0, n, args.batch_size)]
+    legacy_response = measure(
+        [[incident] for incident in incidents],
+        json.dumps,
+        lambda b: json.dumps({"recommended_actions": ACTIONS, "why_these_recommendations": WHY}),
+        "gpt-4.1",
+    )
+    compact_response = measure(
+        incident_batches,
+        lambda b: encode_table(b, INCIDENT_FIELDS),
+        lambda b: json.dumps({"incidents": [{"ref": i, "recommended_actions": ACTIONS, "why_these_recommendations": WHY}
+                                            for i in range(len(b))]}),
+        "gpt-4.1",
+    )
+
+    print(f"{'stage / encoding':<34} {'in/incident':>11} {'out/incident':>12} {'est. s/incident':>15} {'est. $/1k':>9}")
+    for label, (tokens_in, tokens_out) in (
+        ("classification, JSON", legacy),
+        ("classification, table", compact),
+        ("recommendation, JSON (1/call)", legacy_response),
+        ("recommendation, table", compact_response),
+    ):
+        per_in, per_out = tokens_in / n, tokens_out / n
+        cost = (per_in * args.input_price + per_out * args.output_price) / 1e6 * 1000
+        print(f"{label:<34} {per_in:>11.1f} {per_out:>12.1f} {per_out / args.output_tps:>15.2f} {cost:>9.3f}")
+    print()
+
+    for label, before, after in (("classification", legacy, compact), ("recommendation", legacy_response, compact_response)):
+        print(f"{label}: input {after[0] / before[0] - 1:+.0%}, output {after[1] / before[1] - 1:+.0%} tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+End-to-end time of response_recommender_agent: one call at a time vs concurrent calls.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_response_concurrency --incidents 100,1000 --max-in-flight 8
+
+Runs against the local LLM backend (llm.backends) with simulated latency and
+failures, in per-incident mode with the cache off, so every incident is sent to
+the "LLM". Incidents are built from the sample logs in data/, repeated as needed.
+"""
+import argparse
+import copy
+import os
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incidents", default="100,1000")
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated seconds per call")
+    parser.add_argument("--seconds-per-token", type=float, default=0.0005, help="Simulated seconds per reply token")
+    parser.add_argument("--failure-rate", type=float, default=0.05, help="Fraction of calls failing with 429/5xx")
+    parser.add_argument("--rpm", type=int, default=5000, help="Rate limiter requests per minute")
+    parser.add_argument("--tpm", type=int, default=2000000, help="Rate limiter tokens per minute")
+    args = parser.parse_args()
+
+    # Backends and limits are read at import time
+    os.environ.update({
+        "LLM_BACKEND": "local",
+        "LLM_CACHE_ENABLED": "0",
+        "RESPONSE_GROUPING": "incident",
+        "LOCAL_LLM_LATENCY": str(args.latency),
+        "LOCAL_LLM_SECONDS_PER_TOKEN": str(args.seconds_per_token),
+        "LOCAL_LLM_FAILURE_RATE": str(args.failure_rate),
+        "LLM_RPM": str(args.rpm),
+        "LLM_TPM": str(args.tpm),
+    })
+    from ingestion.stream import DATA_DIR, iter_log_chunks
+    from llm.backends import local_classification
+    from llm.concurrency import AdaptiveConcurrency
+    from graph.nodes.incident_manager import build_incident
+    import graph.nodes.response_recommender as recommender
+
+    logs = [log for chunk in iter_log_chunks(DATA_DIR) for log in chunk]
+    print(f"local backend: {args.latency}s + {args.seconds_per_token}s/token per call, "
+          f"{args.failure_rate:.0%} failures; {args.rpm} RPM / {args.tpm} TPM\n")
+
+    rows = []
+    for n in [int(x) for x in args.incidents.split(",")]:
+        incidents = [build_incident(log, local_classification(log.to_dict())) for log in (logs[i % len(logs)] for i in range(n))]
+        baseline = None
+        for label, max_in_flight in (("sequential", 1), (f"concurrent x{args.max_in_flight}", args.max_in_flight)):
+            recommender.RESPONSE_MAX_IN_FLIGHT = max_in_flight
+            recommender.concurrency = AdaptiveConcurrency(max_in_flight)
+            state = {"logs": copy.deepcopy(incidents)}
+            started = time.perf_counter()
+            state = recommender.response_recommender_agent(state)
+            elapsed = time.perf_counter() - started
+            baseline = baseline or elapsed
+            fallbacks = sum(1 for i in state["logs"] if i["why_these_recommendations"] == recommender.FALLBACK_REASONING)
+            rows.append((n, label, elapsed, fallbacks, baseline / elapsed))
+
+    print(f"\n{'incidents':>9} {'mode':<14} {'seconds':>8} {'incidents/s':>11} {'fallbacks':>9} {'speedup':>8}")
+    for n, label, elapsed, fallbacks, speedup in rows:
+        print(f"{n:>9} {label:<14} {elapsed:>8.1f} {n / elapsed:>11.1f} {fallbacks:>9} {speedup:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Scaling of sharded IsolationForest scoring from 1 to N worker processes.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_sharded_scoring --logs 1000000 --workers 1,2,4,8,16,32
+
+Each worker count gets a fresh pool; pool start-up (fork + model load) is timed
+separately from scoring so steady-state throughput is visible.
+"""
+import argparse
+import os
+import time
+import numpy as np
+from benchmarks.bench_extract_features import make_raw_logs
+from ingestion.record import LogRecord
+from ml.sharded import get_scoring_pool, score_logs_sharded, shutdown_scoring_pool, SHARD_SIZE
+
+
+def _warm(_):
+    return os.getpid()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logs", type=int, default=1000000)
+    parser.add_argument("--workers", default=",".join(str(w) for w in (1, 2, 4, 8, 16, 32) if w <= (os.cpu_count() or 1)) or "1")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    args = parser.parse_args()
+
+    logs = [LogRecord.from_raw(r) for r in make_raw_logs(args.logs)]
+    print(f"{args.logs:,} logs, {os.cpu_count()} CPUs, shard size {args.shard_size:,}")
+
+    # Warm up the in-process model and sklearn code paths
+    score_logs_sharded(logs[:1000], workers=1)
+
+    baseline = None
+    reference = None
+    for workers in (int(w) for w in args.workers.split(",")):
+        startup = 0.0
+        if workers > 1:
+            start = time.perf_counter()
+            pool = get_scoring_pool(workers)
+            # Force every worker to start and load the model before timing
+            list(pool.map(_warm, range(workers * 4)))
+            startup = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scores = score_logs_sharded(logs, workers=workers, shard_size=args.shard_size)
+        elapsed = time.perf_counter() - start
+        shutdown_scoring_pool()
+
+        if reference is None:
+            reference = scores
+        assert np.allclose(scores, reference), "sharded scores differ from single-process scores"
+
+        baseline = baseline or elapsed
+        print(f"  {workers:>3} workers  {args.logs / elapsed:>12,.0f} logs/s  {elapsed:7.2f}s  "
+              f"speedup {baseline / elapsed:5.2f}x  (pool start {startup:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
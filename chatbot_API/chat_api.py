@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Query
 from fastapi.responses import StreamingResponse
-from generate_chat_responses import generate_chat_responses
+from chatbot_API.generate_chat_responses import generate_chat_responses
 
 router = APIRouter(prefix="/chat_stream", tags=["Chat Stream"])
 
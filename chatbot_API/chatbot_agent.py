@@ -6,26 +6,27 @@ from langgraph.types import Command
 from langgraph.prebuilt import create_react_agent
 from langchain_mongodb.agent_toolkit.toolkit import MongoDBDatabaseToolkit
 from langchain_mongodb.agent_toolkit.database import MongoDBDatabase
-from langchain_openai import ChatOpenAI
 import os
 from langchain.agents import Tool
-from tools.fulltext_tool import fulltext_query_tool
+from chatbot_API.tools.fulltext_tool import fulltext_query_tool
 from langchain_mongodb.agent_toolkit import MONGODB_AGENT_SYSTEM_PROMPT
 from dotenv import load_dotenv
 load_dotenv()
 
+from llm.backends import get_chat_model
+
 # Tools
-from tools.fulltext_tool import fulltext_query_tool
-from tools.vector_search_tool import vector_search_across_collections
-from tools.collection_list_tool import get_collection_names
-from tools.retrieve_incident_report import retrieve_full_incident_reports
+from chatbot_API.tools.fulltext_tool import fulltext_query_tool
+from chatbot_API.tools.vector_search_tool import vector_search_across_collections
+from chatbot_API.tools.collection_list_tool import get_collection_names
+from chatbot_API.tools.retrieve_incident_report import retrieve_full_incident_reports
 
 # You can adjust temperature or other params here
 
-OPENAI_LLM = ChatOpenAI(
+# OpenAI or the local stand-in, per LLM_BACKEND
+OPENAI_LLM = get_chat_model(
+    "gpt-4.1",
     temperature=0,
-    model="gpt-4.1",
-    api_key=os.getenv("OPENAI_API_KEY"),
     streaming=True,
     verbose=True
 )
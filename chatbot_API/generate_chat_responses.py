@@ -21,7 +21,7 @@ from typing import Optional
 import json
 import asyncio
 from typing import AsyncGenerator
-from chatbot_agent import ChatbotAgent
+from chatbot_API.chatbot_agent import ChatbotAgent
 from langgraph.graph import StateGraph
 from langgraph.graph.message import add_messages, MessagesState
 from langgraph.graph import END
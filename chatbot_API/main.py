@@ -1,7 +1,9 @@
 # main.py
+# Run from the repo root (the chat API shares llm/ and the cache/ directory with the pipeline):
+#   python -m chatbot_API.main   or   uvicorn chatbot_API.main:app
 
 from fastapi import FastAPI
-from chat_api import router as chat_stream_router  # your SSE chat route
+from chatbot_API.chat_api import router as chat_stream_router  # your SSE chat route
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI(
@@ -27,7 +29,7 @@ app.include_router(chat_stream_router)
 def ping():
     return {"status": "ok"}
 
-# Only needed if you want to run using `python main.py`
+# Only needed if you want to run using `python -m chatbot_API.main`
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
+    uvicorn.run("chatbot_API.main:app", host="127.0.0.1", port=8000, reload=True)
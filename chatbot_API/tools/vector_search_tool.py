@@ -4,20 +4,22 @@ from pymongo import MongoClient
 from langchain.tools import Tool
 from langchain_mongodb.retrievers.full_text_search import MongoDBAtlasFullTextSearchRetriever
 import os
-from openai import OpenAI
 from dotenv import load_dotenv
 load_dotenv()
 
+from llm.backends import EMBEDDING_MODEL
+from llm.embeddings import embed_texts
+
 # Connect to MongoDB Atlas
 client = MongoClient(os.getenv("MongoUrl"))
 db = client["soc_incidents"]
 
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-embedding_model = "text-embedding-3-small"
+embedding_model = EMBEDDING_MODEL
 
-def get_embedding(text: str, model: str = "text-embedding-3-small") -> list:
+def get_embedding(text: str, model: str = EMBEDDING_MODEL) -> list:
     """
-    Generate an embedding vector for the given text using OpenAI Embedding API.
+    Generate an embedding vector for the given text with the configured embedding backend,
+    through the shared embedding cache (repeated queries are not re-embedded).
 
     Args:
         text (str): The text to embed.
@@ -27,15 +29,14 @@ def get_embedding(text: str, model: str = "text-embedding-3-small") -> list:
         list: Embedding vector.
     """
     try:
-        text = text.replace("\n", " ")
-        response = openai_client.embeddings.create(
-            model=model,
-            input=text
-        )
-        return response.data[0].embedding
+        vector = embed_texts([text], model=model)[0]
     except Exception as e:
         print(f"Embedding generation failed: {e}")
         return []
+    if vector is None:
+        print("Embedding generation failed: no vector returned")
+        return []
+    return vector
 
 def vector_search_across_collections(input: dict) -> Dict[str, List[Dict]]:
     """
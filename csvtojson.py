@@ -2,6 +2,20 @@ import csv
 import json
 import os
 
+def iter_csv_rows(csv_filepath):
+    """
+    Lazily yields the rows of a CSV file as cleaned dicts.
+    Only one row is held in memory at a time.
+
+    Yields:
+        dict: Parsed row with stripped keys and values
+    """
+    with open(csv_filepath, newline='', encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            yield {k.strip(): v.strip() for k, v in row.items()}
+
+
 def csv_to_json(csv_filepath, json_filepath=None):
     """
     Converts a CSV file to a list of JSON (dicts).
@@ -10,14 +24,8 @@ def csv_to_json(csv_filepath, json_filepath=None):
     Returns:
         List[dict]: Parsed rows as dictionaries
     """
-    data = []
-
     try:
-        with open(csv_filepath, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                cleaned_row = {k.strip(): v.strip() for k, v in row.items()}
-                data.append(cleaned_row)
+        data = list(iter_csv_rows(csv_filepath))
     except Exception as e:
         print(f"Error reading CSV {csv_filepath}: {e}")
         return []
@@ -0,0 +1,132 @@
+"""
+Durable per-node checkpoints of the detection graph.
+
+With checkpointing on, the compiled graph (graph.flow) snapshots its state into
+SQLite after every node under a run ID (langgraph's thread_id). If a node fails,
+e.g. the report's MongoDB insert or an embedding timeout, `resume_run(run_id)`
+continues from the failed node with the state the completed nodes left, so the
+classification and recommendation LLM work already done is not paid again.
+
+Partial work inside the failed step is carried through as well: in the
+partitioned flow, partitions that finished are stored as pending writes and only
+the failed ones run again; within the LLM nodes, finished batches are replayed
+from the LLM cache (llm.cache).
+
+By default only streaming runs (--stream / --columnar) are checkpointed: their
+state holds a `log_source` reference instead of the raw logs, so snapshots carry
+only flagged logs and incidents. An in-memory run would pickle every raw record
+into the input and post-`rules` snapshots; it is checkpointed when asked for
+(CHECKPOINT_ENABLED=1 or an explicit run ID).
+
+Checkpoints of a run are deleted once it completes, unless
+CHECKPOINT_KEEP_COMPLETED=1.
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+from graph.flow import build_graph, build_partitioned_graph
+
+# SQLite file holding the checkpoints of all runs
+CHECKPOINT_PATH = Path(os.getenv("CHECKPOINT_PATH", "cache/checkpoints.sqlite"))
+
+# "auto": checkpoint streaming runs and runs given a run ID; "1": every run; "0": none (no resume)
+CHECKPOINT_ENABLED = os.getenv("CHECKPOINT_ENABLED", "auto").lower()
+
+# Set to 1 to keep the checkpoints of runs that completed (inspection, replays)
+CHECKPOINT_KEEP_COMPLETED = os.getenv("CHECKPOINT_KEEP_COMPLETED", "0") == "1"
+
+# Graph builders by the flow name stored with each run, so a resume rebuilds the same graph
+FLOWS = {
+    "graph": build_graph,
+    "partitioned": build_partitioned_graph,
+}
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer(path=CHECKPOINT_PATH):
+    """
+    Process-wide SQLite checkpointer. State values msgpack can't encode
+    (LogRecord, LogGroup) are pickled; the file is local and written only by this app.
+    """
+    global _checkpointer
+    with _checkpointer_lock:
+        if _checkpointer is None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            # Shared by langgraph's worker threads (partitioned flow); the saver serializes access
+            conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            _checkpointer = SqliteSaver(conn, serde=JsonPlusSerializer(pickle_fallback=True))
+        return _checkpointer
+
+
+def new_run_id():
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def _run_config(run_id, flow_name, config=None):
+    return {**(config or {}), "configurable": {"thread_id": run_id}, "metadata": {"flow": flow_name}}
+
+
+def _finish(checkpointer, run_id):
+    if not CHECKPOINT_KEEP_COMPLETED:
+        checkpointer.delete_thread(run_id)
+
+
+def checkpointed(state, run_id=None):
+    """
+    Whether a run of `state` is checkpointed, per CHECKPOINT_ENABLED.
+    """
+    if CHECKPOINT_ENABLED == "auto":
+        return bool(run_id or state.get("log_source"))
+    return CHECKPOINT_ENABLED != "0"
+
+
+def run_flow(flow_name, state, run_id=None, config=None):
+    """
+    Invokes the named flow (FLOWS) on `state`, checkpointed under `run_id`
+    (generated when not given) when `checkpointed` says so. Returns the final state.
+    """
+    if not checkpointed(state, run_id):
+        return FLOWS[flow_name]().invoke(state, config=config)
+
+    run_id = run_id or new_run_id()
+    checkpointer = get_checkpointer()
+    flow = FLOWS[flow_name](checkpointer=checkpointer)
+    print(f"[Checkpoint] Run {run_id} ({flow_name}); if it fails, continue it with --resume {run_id}")
+    final_state = flow.invoke(state, config=_run_config(run_id, flow_name, config))
+    _finish(checkpointer, run_id)
+    return final_state
+
+
+def resume_run(run_id, config=None):
+    """
+    Continues a failed run from its last checkpoint: the nodes that completed are
+    skipped and the graph restarts at the node that failed. Returns the final state.
+    """
+    checkpointer = get_checkpointer()
+    saved = checkpointer.get_tuple({"configurable": {"thread_id": run_id}})
+    if saved is None:
+        raise ValueError(f"No checkpoints for run {run_id} in {CHECKPOINT_PATH}")
+
+    flow_name = saved.metadata.get("flow", "graph")
+    flow = FLOWS[flow_name](checkpointer=checkpointer)
+    run_config = _run_config(run_id, flow_name, config)
+    snapshot = flow.get_state(run_config)
+    if not snapshot.next:
+        print(f"[Checkpoint] Run {run_id} already completed")
+        return snapshot.values
+
+    pending = Counter(snapshot.next)
+    nodes = ", ".join(name if n == 1 else f"{name} x{n}" for name, n in pending.items())
+    print(f"[Checkpoint] Resuming run {run_id} ({flow_name}) at {nodes} (step {saved.metadata.get('step')})")
+    final_state = flow.invoke(None, config=run_config)
+    _finish(checkpointer, run_id)
+    return final_state
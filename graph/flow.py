@@ -1,27 +1,38 @@
 from langgraph.graph import StateGraph, END
-from state_schema import State
+from state_schema import PartitionState, State
+from graph.nodes.rule_engine import rule_engine_agent
 from graph.nodes.threat_detector import threat_detector_agent
+from graph.nodes.log_coalescer import log_coalescer_agent
 from graph.nodes.incident_manager import incident_manager_agent
 from graph.nodes.audit_control import audit_control_agent
 from graph.nodes.response_recommender import response_recommender_agent
 from graph.nodes.report_generator import report_generator
+from graph.partitioned import fan_out, partition_agent, reduce_report
 
 
-def build_graph():
+def build_graph(checkpointer=None):
+    """
+    Linear detection graph. With a `checkpointer` (graph.checkpoints) the state is
+    snapshotted after every node, so a failed run can be resumed.
+    """
     graph = StateGraph(State)
 
     # Register nodes
+    graph.add_node("rules", rule_engine_agent)
     graph.add_node("detect", threat_detector_agent)
+    graph.add_node("coalesce", log_coalescer_agent)
     graph.add_node("context", incident_manager_agent)
     graph.add_node("audit", audit_control_agent)
     graph.add_node("response", response_recommender_agent)
     graph.add_node("report", report_generator)
 
     # Define entry point
-    graph.set_entry_point("detect")
+    graph.set_entry_point("rules")
 
     # Static edges
-    graph.add_edge("detect", "context")
+    graph.add_edge("rules", "detect")
+    graph.add_edge("detect", "coalesce")
+    graph.add_edge("coalesce", "context")
     graph.add_edge("context", "audit")
     graph.add_conditional_edges("audit", lambda state: "response" if state.get("rbac_passed", False) else "end", {
         "response": "response",
@@ -30,4 +41,28 @@ def build_graph():
     graph.add_edge("response", "report")
     graph.add_edge("report", END)
 
-    return graph.compile()
+    return graph.compile(checkpointer=checkpointer)
+
+
+def build_partitioned_graph(checkpointer=None):
+    """
+    Map-reduce variant (graph.partitioned): rules and audit run once, then each
+    log partition runs detect → coalesce → context → response in parallel via
+    Send, and one report is generated from all partitions' incidents.
+    """
+    graph = StateGraph(State)
+
+    graph.add_node("rules", rule_engine_agent)
+    graph.add_node("audit", audit_control_agent)
+    graph.add_node("partition", partition_agent, input_schema=PartitionState)
+    graph.add_node("report", reduce_report)
+
+    graph.set_entry_point("rules")
+
+    graph.add_edge("rules", "audit")
+    # One Send per partition; the report runs once every partition has finished
+    graph.add_conditional_edges("audit", fan_out, ["partition", "report"])
+    graph.add_edge("partition", "report")
+    graph.add_edge("report", END)
+
+    return graph.compile(checkpointer=checkpointer)
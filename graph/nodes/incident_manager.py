@@ -1,31 +1,49 @@
 import uuid
 import os
-import json
-from langchain_openai import ChatOpenAI
+import threading
 from langchain.prompts import ChatPromptTemplate
+from rules.engine import get_rule_engine
+from graph.nodes.log_coalescer import LogGroup
+from llm.concurrency import LLM_MAX_IN_FLIGHT, call_with_retries, gather_limited, is_retryable, run_async
+from llm.backends import get_chat_model
+from llm.batching import count_tokens, plan_batches, template_tokens
+from llm.cache import LLM_CACHE_ENABLED, LLMCache, prompt_version
+from llm.codec import TABLE_FORMAT_HINT, encode_row, encode_table
+from llm.recovery import RecoveryStats, align_entries, parse_json_entries, resolve_with_bisection
 from dotenv import load_dotenv
 load_dotenv()
 
-# Setup LangChain LLM instance
-llm = ChatOpenAI(model="gpt-4o", temperature=0.2, api_key=os.getenv("OPENAI_API_KEY"))
+LLM_MODEL = "gpt-4o"
+
+# Setup LangChain LLM instance (OpenAI or the local stand-in, per LLM_BACKEND)
+llm = get_chat_model(LLM_MODEL, temperature=0.2)
+
+# JSON mode: the reply is always a syntactically valid JSON object
+json_llm = llm.bind(response_format={"type": "json_object"})
 
 # LangChain Prompt Template
 prompt = ChatPromptTemplate.from_messages([
     ("system", "You are a security incident triage assistant. Analyze logs to identify threats, correlate similar events, assess risk, and return incident records."),
     ("user", """
-You are given a list of suspicious logs. For each log, return a JSON object with:
-- threat_type 
-- affected_user
-- source_ip
-- affected_system 
-- endpoint 
-- timestamp
+You are given a table of suspicious logs. For each row, return a JSON object with only
+the fields you infer:
+- ref (the row's ref, unchanged)
+- threat_type
+- affected_system
 - summary (1–2 sentence explanation)
 - impact (business impact)
 - risk_score (1–10)
-- event_type
 
-Output a list of such JSON objects (one per log).
+Do not repeat the row's own fields (user, IP, endpoint, timestamp, event); they are
+merged back from the source logs.
+
+A row with `count`, `first_seen` and `last_seen` stands for that many near-identical
+logs (same user, IP, endpoint and event) seen in that time range; classify it once,
+taking the volume into account.
+
+Output a JSON object of the form {{"incidents": [...]}} with one such object per row.
+
+""" + TABLE_FORMAT_HINT + """
 
 Logs:
 {logs}
@@ -33,21 +51,125 @@ Logs:
 ])
 
 
-def classify_logs_with_llm(logs):
+# Expected completion tokens per classified entry (one JSON incident object)
+OUTPUT_TOKENS_PER_LOG = int(os.getenv("INCIDENT_OUTPUT_TOKENS_PER_LOG", 100))
+
+
+# Per-log fields, merged back from the log rather than cached if the LLM echoes them
+PER_LOG_FIELDS = ("affected_user", "source_ip", "endpoint", "timestamp")
+
+# Volatile fields left out of cache keys so recurring patterns hit across days
+UNCACHED_FIELDS = ("timestamp", "first_seen", "last_seen")
+
+_cache = None
+# Guards the cache singleton and recovery_stats across pipeline threads
+_lock = threading.Lock()
+
+
+def get_classification_cache():
+    """
+    Persistent classification cache; keyed on the prompt template and model so
+    editing either invalidates earlier entries.
+    """
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = LLMCache("incident_manager", prompt_version(prompt, getattr(llm, "model_name", type(llm).__name__)))
+        return _cache
+
+
+def cache_payload(group):
+    """
+    Normalized form of a group used as its cache key: the LLM input without
+    timestamps, with the count reduced to its order of magnitude.
+    """
+    data = {k: v for k, v in group.to_dict().items() if k not in UNCACHED_FIELDS}
+    if "count" in data:
+        data["count"] = data["count"].bit_length()
+    return data
+
+
+# Deterministic threat types for records the LLM could not classify
+FALLBACK_THREAT_TYPES = {
+    "FAILED_LOGIN": "brute_force",
+    "MALICIOUS_TRANSFER": "malicious_transfer",
+    "UNKNOWN_ACTIVITY": "unknown_activity",
+}
+
+# Cumulative for the process; each node invocation counts into its own RecoveryStats and merges here
+recovery_stats = RecoveryStats()
+
+
+def validate_analysis(entry):
+    """
+    Checks one LLM incident object against the expected schema; returns it with a
+    numeric risk_score, or None when required fields are missing or malformed.
+    """
+    if not isinstance(entry.get("threat_type"), str) or not entry["threat_type"].strip():
+        return None
+    if not isinstance(entry.get("summary"), str):
+        return None
     try:
-        chain = prompt | llm
-        response = chain.invoke({"logs": json.dumps(logs)})
-        content = response.content.strip()
+        risk = float(entry.get("risk_score"))
+    except (TypeError, ValueError):
+        return None
+    if not 0 <= risk <= 10:
+        return None
+    entry["risk_score"] = int(risk) if risk.is_integer() else risk
+    return entry
 
-        # Strip code block if present
-        if content.startswith("```json"):
-            content = content[7:].strip()  # remove ```json
-        if content.endswith("```"):
-            content = content[:-3].strip()  # remove ```
 
-        return json.loads(content)
+def fallback_analysis(group):
+    """
+    Rule-based classification for a record that failed LLM classification on its own.
+    """
+    log = group.sample
+    endpoint = log.endpoint or ""
+    threat_type = FALLBACK_THREAT_TYPES.get(log.event)
+    if threat_type is None:
+        threat_type = "plp_access" if "/plp" in endpoint else "generic_suspicious_activity"
+    return {
+        "threat_type": threat_type,
+        "affected_system": "internal_plp" if "/plp" in endpoint else (log.system or "mobile_app"),
+        "summary": f"{threat_type.replace('_', ' ').title()} detected via fallback rules.",
+        "impact": "Potential unauthorized access or misuse.",
+        "risk_score": 5,
+        "fallback": True
+    }
+
+
+async def aclassify_logs_with_llm(logs):
+    """
+    One rate-limited LLM call (retried on 429/5xx) for a batch of logs or groups.
+
+    Returns a list aligned with `logs`: the validated analysis for each entry, or
+    None where the reply was missing, truncated or malformed for that entry (or
+    the call was rejected, e.g. over the context length). Retryable errors that
+    outlasted the retries are raised, so the batch isn't bisected into more of them.
+    """
+    payload = encode_table([log.to_dict() for log in logs])
+    tokens = template_tokens(prompt, LLM_MODEL) + count_tokens(payload, LLM_MODEL) + OUTPUT_TOKENS_PER_LOG * len(logs)
+    try:
+        chain = prompt | json_llm
+        response = await call_with_retries(lambda: chain.ainvoke({"logs": payload}), tokens=tokens)
     except Exception as e:
-        print(f"[LLM Incident Manager] Error: {e}")
+        print(f"[LLM Incident Manager] Error: {str(e) or type(e).__name__}")
+        if is_retryable(e):
+            raise
+        return [None] * len(logs)
+    return align_entries(parse_json_entries(response.content), len(logs), validate_analysis)
+
+
+async def classify_with_recovery(logs, stats=recovery_stats):
+    """
+    Classifies a batch, bisecting and retrying failed parts so that only records
+    that fail on their own fall back to `fallback_analysis`.
+    """
+    return await resolve_with_bisection(logs, aclassify_logs_with_llm, fallback_analysis, stats)
+
+
+def classify_logs_with_llm(logs):
+    return run_async(classify_with_recovery(logs))
 
 
 # # LangChain Prompt Template (per log)
@@ -104,51 +226,156 @@ def classify_logs_with_llm(logs):
 #     return results
 
 
+def build_incident(log, analysis, group_size=1):
+    """
+    Builds one incident by merging the LLM's inferred fields for the log's group
+    (threat type, system, summary, impact, risk) with the log's own fields.
+    """
+    incident_id = f"INC{str(uuid.uuid4())[:8].upper()}"
+    report = {
+        "incident_id": incident_id,
+        "threat_type": analysis.get("threat_type", "Unknown").replace("_", " ").title(),
+        "affected_user": log.user or analysis.get("affected_user", "Unknown"),
+        "source_ip": log.ip or analysis.get("source_ip", "Unknown"),
+        "system": analysis.get("affected_system", log.system or "Unknown"),
+        "endpoint": log.endpoint or analysis.get("endpoint", "Unknown"),
+        "detected_at": log.timestamp or analysis.get("timestamp", "Unknown"),
+        "summary": analysis.get("summary", log.message or "No message"),
+        "impact": analysis.get("impact", "Unknown"),
+        "risk_score": analysis.get("risk_score", "Medium"),
+        "event_type": log.event or log.level or "Info"
+    }
+    if group_size > 1:
+        report["group_size"] = group_size
+    return report
+
+
+def build_rule_incident(log):
+    """
+    Builds an incident for a log tagged by a detection rule, from the rule's
+    config instead of an LLM call.
+    """
+    rule = get_rule_engine().rules.get(log.rule)
+    return {
+        "incident_id": f"INC{str(uuid.uuid4())[:8].upper()}",
+        "threat_type": (log.threat_type or "Unknown").replace("_", " ").title(),
+        "affected_user": log.user or "Unknown",
+        "source_ip": log.ip or "Unknown",
+        "system": (rule and rule.affected_system) or log.system or "Unknown",
+        "endpoint": log.endpoint or "Unknown",
+        "detected_at": log.timestamp or "Unknown",
+        "summary": rule.describe(log) if rule else (log.message or "No message"),
+        "impact": rule.impact if rule else "Unknown",
+        "risk_score": rule.risk_score if rule else "Medium",
+        "event_type": log.event or log.level or "Info",
+        "detected_by": f"rule:{log.rule}"
+    }
+
+
 def incident_manager_agent(state):
     """
-    IncidentManagerAgent: Batches suspicious logs (10 at a time), analyzes them using GPT-4o,
-    and returns structured incident reports.
+    IncidentManagerAgent: Batches suspicious log groups, analyzes them using GPT-4o, and
+    returns structured incident reports, one per original log. Batches are packed up
+    to LLM_INPUT_TOKEN_BUDGET / LLM_OUTPUT_TOKEN_BUDGET tokens (llm.batching).
+
+    Batches are classified concurrently (up to LLM_MAX_IN_FLIGHT) under the shared
+    RPM/TPM rate limiter (llm.concurrency), retried with jittered backoff on 429/5xx,
+    and reassembled in input order. Replies are schema-checked per entry; failed
+    entries are re-sent and failed batches bisected (llm.recovery), so only a record
+    that fails on its own gets a deterministic fallback classification.
+
+    Logs already tagged by the rule engine become incidents straight from their
+    rule's config, without an LLM call. Classifications are cached on disk
+    (llm.cache) by normalized log content, so recurring patterns skip the LLM.
+
+    Logs are sent in the compact table encoding of llm.codec and the model returns
+    only the fields it infers, keyed by row; the rest is merged back from the logs.
 
     Input:
-    - state['logs']: List of suspicious logs
+    - state['logs']: List of LogGroups from the coalescer (bare LogRecords are treated
+      as single-log groups)
+    - state['rule_matches'] (optional): LogRecords tagged by a detection rule
 
     Output:
     - state['logs']: List of structured incident dicts
     """
     suspicious_logs = state.get("logs", [])
+    rule_matches = state.get("rule_matches") or []
     print(f"Length of suspicious log: {len(suspicious_logs)}")
-    if not suspicious_logs:
+    if not suspicious_logs and not rule_matches:
         state["logs"] = []
         return state
 
-    incidents = []
+    incidents = [build_rule_incident(log) for log in rule_matches]
+    suspicious_logs = [item if isinstance(item, LogGroup) else LogGroup(None, item) for item in suspicious_logs]
 
-    # Process logs in batches of 10
-    batch_size = 10
-    for i in range(0, len(suspicious_logs), batch_size):
-        batch = suspicious_logs[i:i + batch_size]
-        try:
-            enriched_batch = classify_logs_with_llm(batch)
-        except Exception as e:
-            print(f"Batch {i//batch_size + 1} failed: {e}")
-            continue
+    analyses = [None] * len(suspicious_logs)
+    pending = list(range(len(suspicious_logs)))
+    cache = get_classification_cache() if LLM_CACHE_ENABLED else None
+    if cache is not None:
+        # Only groups with no cached classification go to the LLM, once per distinct key
+        keys = [cache.key(cache_payload(group)) for group in suspicious_logs]
+        found = cache.get_many(keys)
+        first_index = {}
+        pending = []
+        for i, key in enumerate(keys):
+            if key in found:
+                analyses[i] = dict(found[key])
+            elif key not in first_index:
+                first_index[key] = i
+                pending.append(i)
 
-        for log, analysis in zip(batch, enriched_batch):
-            incident_id = f"INC{str(uuid.uuid4())[:8].upper()}"
-            report = {
-                "incident_id": incident_id,
-                "threat_type": analysis.get("threat_type", "Unknown").replace("_", " ").title(),
-                "affected_user": analysis.get("affected_user", "Unknown"),
-                "source_ip": analysis.get("source_ip", "Unknown"),
-                "system": analysis.get("affected_system", log.get("HOSTNAME", "Unknown")),
-                "endpoint": analysis.get("endpoint", "Unknown"),
-                "detected_at": analysis.get("timestamp", log.get("TIMESTAMP", "Unknown")),
-                "summary": analysis.get("summary", log.get("MESSAGE", "No message")),
-                "impact": analysis.get("impact", "Unknown"),
-                "risk_score": analysis.get("risk_score", "Medium"),
-                "event_type": log.get("event") or log.get("LEVEL", "Info")
-            }
-            incidents.append(report)
+    # Pack batches by token budget rather than a fixed count
+    batches = plan_batches(
+        pending, lambda i: encode_row(suspicious_logs[i].to_dict()), OUTPUT_TOKENS_PER_LOG,
+        prompt_tokens=template_tokens(prompt, LLM_MODEL), model=LLM_MODEL
+    )
+
+    async def classify_batch(batch):
+        results = await classify_with_recovery([suspicious_logs[i] for i in batch], run_stats)
+        if cache is not None:
+            # Cached as each batch completes, so a failure later in the node keeps the finished batches;
+            # fallback classifications are used for this run but never cached
+            cache.put_many({
+                keys[i]: {k: v for k, v in analysis.items() if k not in PER_LOG_FIELDS}
+                for i, analysis in zip(batch, results) if not analysis.get("fallback")
+            })
+        return results
+
+    # Batches go out concurrently (LLM_MAX_IN_FLIGHT); gather returns them in input order
+    # Per invocation: the pipelined runner classifies several micro-batches at once
+    run_stats = RecoveryStats()
+    results = run_async(gather_limited(batches, classify_batch, LLM_MAX_IN_FLIGHT))
+    with _lock:
+        recovery_stats.merge(run_stats)
+
+    fresh = {}
+    for batch, enriched_batch in zip(batches, results):
+        for i, analysis in zip(batch, enriched_batch):
+            analyses[i] = analysis
+            if cache is not None:
+                fresh[keys[i]] = {k: v for k, v in analysis.items() if k not in PER_LOG_FIELDS}
+
+    if batches:
+        print(f"[LLM Incident Manager] {len(batches)} batches, {run_stats.calls} calls, {run_stats.retries} retries "
+              f"({run_stats.bisections} bisections), {run_stats.fallbacks} fallbacks")
+
+    if cache is not None:
+        # Groups that shared a key with a group classified in this run
+        for i, key in enumerate(keys):
+            if analyses[i] is None and key in fresh:
+                analyses[i] = dict(fresh[key])
+        if suspicious_logs:
+            hits = sum(1 for key in keys if key in found)
+            print(f"[LLM Cache] {hits} hits, {len(keys) - hits} misses ({hits / len(keys):.0%}), "
+                  f"{len(pending)} sent to the LLM; {cache.hit_ratio:.0%} hit ratio since start")
+
+    # Fan each group's classification back out to one incident per log
+    for group, analysis in zip(suspicious_logs, analyses):
+        if analysis is None:
+            continue
+        for log in group.records:
+            incidents.append(build_incident(log, analysis, group.count))
 
     # Save the incidents and enrich the data
     state["logs"] = incidents
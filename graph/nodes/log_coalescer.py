@@ -0,0 +1,90 @@
+import os
+from ingestion.record import format_timestamp
+
+# LogRecord fields that make suspicious logs near-identical for classification
+COALESCE_KEY = tuple(f.strip() for f in os.getenv("COALESCE_KEY", "user,ip,endpoint,event").split(",") if f.strip())
+
+# Width of the time bucket logs must share to be coalesced (0 = ignore time)
+COALESCE_BUCKET_SECONDS = int(os.getenv("COALESCE_BUCKET_SECONDS", 300))
+
+
+class LogGroup:
+    """
+    Suspicious logs sharing a coalescing key and time bucket, classified once.
+
+    `sample` is the representative sent to the LLM: the most anomalous member
+    (lowest score), or the first one when logs are unscored. `records` keeps every
+    member so one incident per log can be rebuilt from the group's classification.
+    """
+
+    __slots__ = ("key", "records", "sample", "first_ts", "last_ts")
+
+    def __init__(self, key, record):
+        self.key = key
+        self.records = [record]
+        self.sample = record
+        self.first_ts = self.last_ts = record.ts
+
+    def add(self, record):
+        self.records.append(record)
+        if record.score is not None and (self.sample.score is None or record.score < self.sample.score):
+            self.sample = record
+        if record.ts is not None:
+            if self.first_ts is None or record.ts < self.first_ts:
+                self.first_ts = record.ts
+            if self.last_ts is None or record.ts > self.last_ts:
+                self.last_ts = record.ts
+
+    @property
+    def count(self):
+        return len(self.records)
+
+    def to_dict(self):
+        """
+        The sample's fields plus group statistics, as sent to the LLM.
+        """
+        data = self.sample.to_dict()
+        if self.count > 1:
+            data["count"] = self.count
+            if self.first_ts is not None:
+                data["first_seen"] = format_timestamp(self.first_ts)
+                data["last_seen"] = format_timestamp(self.last_ts)
+        return data
+
+
+def coalesce_logs(logs, key=COALESCE_KEY, bucket_seconds=COALESCE_BUCKET_SECONDS):
+    """
+    Groups LogRecords by `key` fields and time bucket in one pass. Groups are
+    returned in order of their first member, so a ranked input stays ranked.
+    """
+    groups = {}
+    for record in logs:
+        bucket = record.ts // bucket_seconds if bucket_seconds and record.ts is not None else None
+        group_key = tuple(getattr(record, field) for field in key) + (bucket,)
+        group = groups.get(group_key)
+        if group is None:
+            groups[group_key] = LogGroup(group_key, record)
+        else:
+            group.add(record)
+    return list(groups.values())
+
+
+def log_coalescer_agent(state):
+    """
+    LogCoalescerAgent: Collapses near-identical suspicious logs (same COALESCE_KEY
+    fields within a COALESCE_BUCKET_SECONDS bucket) so the incident manager makes
+    one LLM classification per group instead of per log.
+
+    Input:
+    - state['logs']: Suspicious LogRecords from the detector
+
+    Output:
+    - state['logs']: LogGroups, each carrying its member LogRecords
+    """
+    logs = state.get("logs", [])
+    groups = coalesce_logs(logs)
+    if logs:
+        print(f"[Log Coalescer] {len(logs)} suspicious logs -> {len(groups)} groups")
+
+    state["logs"] = groups
+    return state
@@ -2,8 +2,8 @@ import json
 import os
 from pymongo import MongoClient
 from dotenv import load_dotenv
-from openai import OpenAI
-from tqdm import tqdm
+from llm.backends import EMBEDDING_MODEL
+from llm.embeddings import embed_texts
 
 load_dotenv()
 
@@ -11,33 +11,30 @@ load_dotenv()
 client = MongoClient(os.getenv("MongoUrl"))
 db = client["soc_incidents"]
 
-# Setup OpenAI
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-embedding_model = "text-embedding-3-small"
-# collection_name = "Incidents"
+# Set to 0 to only write the report file (offline runs, benchmarks)
+REPORT_TO_MONGO = os.getenv("REPORT_TO_MONGO", "1") != "0"
 
-def generate_embedding(text):
-    try:
-        response = openai_client.embeddings.create(
-            model=embedding_model,
-            input=text
-        )
-        return response.data[0].embedding
-    except Exception as e:
-        print(f"Embedding error: {e}")
-        return []
+# Directory the report files are written to
+REPORTS_DIR = os.getenv("REPORTS_DIR", "reports")
 
-def report_generator(state):
-    print("Report Generation: generating report .......")
+embedding_model = EMBEDDING_MODEL
+# collection_name = "Incidents"
 
-    incidents = state.get("logs", [])
-    filename = state.get("report_filename", "Incident Report UNKNOWN.json")
-    report_name = filename.replace(".json", "")
-    collection_name = filename.replace(".json", "")
+def generate_embedding(text):
+    # Single text; None when it could not be embedded
+    return embed_texts([text])[0]
 
+def summarize_incidents(incidents, report_name):
+    """
+    Report entries (with embeddings) for a list of incidents; called per
+    micro-batch by the pipelined runner, once for the whole list otherwise.
+    Embeddings are requested in batches (llm.embeddings); an entry whose text
+    could not be embedded is stored without an `embedding` field.
+    """
     summary_report = []
+    embed_inputs = []
 
-    for incident in tqdm(incidents, desc="Generating embeddings"):
+    for incident in incidents:
         summary = {
             "incident_id": incident.get("incident_id"),
             "threat_type": incident.get("threat_type"),
@@ -59,23 +56,48 @@ def report_generator(state):
             if k not in {"incident_id", "detected_at"} and v
         )
 
-        summary["embedding"] = generate_embedding(embed_input)
-        summary["report_name"] = report_name
+        embed_inputs.append(embed_input)
         summary_report.append(summary)
 
+    for summary, vector in zip(summary_report, embed_texts(embed_inputs)):
+        if vector is not None:
+            summary["embedding"] = vector
+        summary["report_name"] = report_name
+
+    return summary_report
+
+
+def write_report(summary_report, filename):
+    """
+    Writes the report file and inserts its entries into MongoDB, once all
+    entries are known.
+    """
+    collection_name = filename.replace(".json", "")
+
     # Save JSON file (without embedding or report_name)
     clean_report = [
         {k: v for k, v in incident.items() if k not in {"embedding", "report_name"}}
         for incident in summary_report
     ]
-    os.makedirs("reports", exist_ok=True)
-    with open(f"reports/{filename}", "w") as f:
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    path = os.path.join(REPORTS_DIR, filename)
+    with open(path, "w") as f:
         json.dump(clean_report, f, indent=2)
-    print(f"Incident report is stored as: reports/{filename}")
+    print(f"Incident report is stored as: {path}")
 
     # Insert to MongoDB
-    if summary_report:
+    if summary_report and REPORT_TO_MONGO:
         db[collection_name].insert_many(summary_report)
         print(f"Inserted {len(summary_report)} incidents into MongoDB collection: {collection_name}")
 
+
+def report_generator(state):
+    print("Report Generation: generating report .......")
+
+    incidents = state.get("logs", [])
+    filename = state.get("report_filename", "Incident Report UNKNOWN.json")
+    report_name = filename.replace(".json", "")
+
+    write_report(summarize_incidents(incidents, report_name), filename)
+
     return state
@@ -1,41 +1,316 @@
 import os
-import json
-from langchain_openai import ChatOpenAI
+import threading
+import time
+from collections import Counter
 from langchain.prompts import ChatPromptTemplate
+from llm.backends import get_chat_model
+from llm.batching import count_tokens, plan_batches, template_tokens
+from llm.cache import LLM_CACHE_ENABLED, LLMCache, prompt_version
+from llm.codec import TABLE_FORMAT_HINT, encode_row, encode_table
+from llm.concurrency import (LLM_CALL_TIMEOUT, LLM_MAX_IN_FLIGHT, AdaptiveConcurrency, call_with_retries,
+                             gather_limited, run_async)
+from llm.recovery import align_entries, parse_json_entries
 from dotenv import load_dotenv
 load_dotenv()
 
-# Setup LangChain LLM
-llm = ChatOpenAI(model="gpt-4.1", temperature=0.3, api_key=os.getenv("OPENAI_API_KEY"))
+LLM_MODEL = "gpt-4.1"
+
+# "signature": one playbook per (threat_type, system, endpoint), shared by its incidents;
+# "incident": one recommendation per incident
+RESPONSE_GROUPING = os.getenv("RESPONSE_GROUPING", "signature")
+
+# Incidents with equal values for these fields share a playbook
+SIGNATURE_FIELDS = ("threat_type", "system", "endpoint")
+
+# Expected completion tokens per incident (actions + justification)
+OUTPUT_TOKENS_PER_INCIDENT = int(os.getenv("RESPONSE_OUTPUT_TOKENS_PER_INCIDENT", 220))
+
+# Max recommendation calls in flight (1 = one batch at a time); the adaptive limit
+# starts here and is halved on 429s
+RESPONSE_MAX_IN_FLIGHT = int(os.getenv("RESPONSE_MAX_IN_FLIGHT", LLM_MAX_IN_FLIGHT))
+
+# Incident fields the model sees; it returns only recommendations keyed by row
+PROMPT_FIELDS = ["threat_type", "affected_user", "source_ip", "system", "endpoint", "detected_at",
+                 "summary", "impact", "risk_score", "event_type", "group_size"]
+
+# Signature fields the model sees in grouping mode
+PLAYBOOK_FIELDS = list(SIGNATURE_FIELDS) + ["event_type", "incidents", "risk_score", "summary"]
+
+FALLBACK_ACTIONS = ["Escalate to human analyst", "Log and review in audit"]
+FALLBACK_REASONING = "Fallback recommendation: LLM analysis failed."
+
+# Setup LangChain LLM (OpenAI or the local stand-in, per LLM_BACKEND)
+llm = get_chat_model(LLM_MODEL, temperature=0.3)
+
+# Shared by all runs of the node, so a limit cut on 429s carries over
+concurrency = AdaptiveConcurrency(RESPONSE_MAX_IN_FLIGHT)
 
 # Define prompt template
 prompt = ChatPromptTemplate.from_messages([
     ("system", "You are a cybersecurity response advisor. Based on each incident, generate actionable and SOC-relevant mitigation steps with concise threat-specific justifications."),
     ("user", """
-Below is a list of security incident reports. For these incidents:
+Below is a table of security incident reports. For each incident:
 
 1. Provide up to 5 recommended actions (bullet points, concise)
 2. Provide a **one-sentence justification** for these actions, focused on threat pattern, severity, and context (like IP reputation, rate of access, OWASP mapping, etc.)
 
-Return JSON:
-{{
-  "recommended_actions": [...],
-  "why_these_recommendations": "Short explanation: threat pattern, evidence, and impact."
-}}
+Return a JSON object with one entry per row, keyed by the row's ref:
+{{"incidents": [
+  {{
+    "ref": 0,
+    "recommended_actions": [...],
+    "why_these_recommendations": "Short explanation: threat pattern, evidence, and impact."
+  }}
+]}}
+
+""" + TABLE_FORMAT_HINT + """
 
 Incidents:
 {incidents}
     """)
 ])
 
+# Prompt of the grouping mode: one playbook per incident signature
+playbook_prompt = ChatPromptTemplate.from_messages([
+    ("system", "You are a cybersecurity response advisor. For each class of incident, write a reusable, SOC-relevant response playbook with a concise threat-specific justification."),
+    ("user", """
+Below is a table of incident signatures. Each row stands for `incidents` incidents with the
+same threat type, system and endpoint; `event_type` is their most common event,
+`risk_score` the highest among them and `summary` a representative description.
+
+For each signature:
+
+1. Provide up to 5 recommended actions that apply to every incident of the signature (concise)
+2. Provide a **one-sentence justification** for the playbook, focused on threat pattern, severity, and context (like rate of access, OWASP mapping, etc.)
+
+Return a JSON object with one entry per row, keyed by the row's ref:
+{{"playbooks": [
+  {{
+    "ref": 0,
+    "recommended_actions": [...],
+    "why_these_recommendations": "Short explanation: threat pattern, evidence, and impact."
+  }}
+]}}
+
+""" + TABLE_FORMAT_HINT + """
+
+Signatures:
+{signatures}
+    """)
+])
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_playbook_cache():
+    """
+    Persistent playbook cache, keyed by incident signature; versioned on the
+    playbook prompt and model so editing either invalidates earlier playbooks.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache("response_playbooks", prompt_version(playbook_prompt, getattr(llm, "model_name", type(llm).__name__)))
+        return _cache
+
+
+def incident_signature(incident):
+    return tuple(incident.get(field) for field in SIGNATURE_FIELDS)
+
+
+def clean_reasoning(item):
+    reasoning = item.get("why_these_recommendations", "No reasoning provided.")
+    if reasoning.startswith("Short explanation: "):
+        reasoning = reasoning[19:].strip()
+    return reasoning
+
+
+def validate_recommendation(item):
+    """
+    Checks one reply entry; returns {recommended_actions, why_these_recommendations}
+    or None when the actions are missing or malformed.
+    """
+    actions = item.get("recommended_actions")
+    if not isinstance(actions, list) or not actions:
+        return None
+    reasoning = item.get("why_these_recommendations")
+    item["why_these_recommendations"] = clean_reasoning(item) if isinstance(reasoning, str) else "No reasoning provided."
+    return item
+
+
+def run_batches(batches, template, variable, encode, list_key, label, on_batch=None):
+    """
+    Sends each batch as one LLM call, up to RESPONSE_MAX_IN_FLIGHT at once under
+    the adaptive concurrency limit and the shared RPM/TPM rate limiter
+    (llm.concurrency). 429s, 5xx and calls exceeding LLM_CALL_TIMEOUT are retried
+    with backoff and Retry-After; a batch only fails once its retries run out.
+
+    Returns one list per batch, in order, with the validated entry for each item
+    or None where none came back. `on_batch(batch, items)` is called as each
+    batch completes (e.g. to cache it before the other batches are done).
+    """
+    chain = template | llm
+    prompt_tokens = template_tokens(template, LLM_MODEL)
+
+    async def send(batch):
+        payload = encode(batch)
+        tokens = prompt_tokens + count_tokens(payload, LLM_MODEL) + OUTPUT_TOKENS_PER_INCIDENT * len(batch)
+        try:
+            response = await call_with_retries(
+                lambda: chain.ainvoke({variable: payload}), tokens=tokens,
+                concurrency=concurrency, timeout=LLM_CALL_TIMEOUT
+            )
+        except Exception as e:
+            print(f"[LLM Response Recommender] Error for batch of {len(batch)} {label}: {str(e) or type(e).__name__}")
+            return [None] * len(batch)
+        items = align_entries(parse_json_entries(response.content, list_key), len(batch), validate_recommendation)
+        if on_batch is not None:
+            on_batch(batch, items)
+        return items
+
+    started = time.perf_counter()
+    results = run_async(gather_limited(batches, send, RESPONSE_MAX_IN_FLIGHT))
+    if batches:
+        print(f"[LLM Response Recommender] {len(batches)} calls in {time.perf_counter() - started:.1f}s, "
+              f"concurrency limit {int(concurrency.limit)}/{RESPONSE_MAX_IN_FLIGHT} ({concurrency.cuts} cuts on 429s)")
+    return results
+
+
+def signature_row(incidents):
+    """
+    Prompt row of one signature: its fields plus the group's size, most common
+    event, highest risk and a representative summary.
+    """
+    first = incidents[0]
+    risks = [i.get("risk_score") for i in incidents if isinstance(i.get("risk_score"), (int, float))]
+    row = {field: first.get(field) for field in SIGNATURE_FIELDS}
+    row["event_type"] = Counter(i.get("event_type") for i in incidents).most_common(1)[0][0]
+    row["incidents"] = len(incidents)
+    row["risk_score"] = max(risks) if risks else first.get("risk_score")
+    row["summary"] = first.get("summary")
+    return row
+
+
+def justify(incident, rationale):
+    """
+    Per-incident justification: the signature's shared rationale plus the
+    incident's own evidence.
+    """
+    evidence = (f"{incident.get('event_type')} by {incident.get('affected_user')} from {incident.get('source_ip')} "
+                f"at {incident.get('detected_at')}, risk score {incident.get('risk_score')}")
+    if incident.get("group_size", 1) > 1:
+        evidence += f", {incident['group_size']} similar events"
+    return f"{rationale} This incident: {evidence}."
+
+
+def recommend_per_incident(reports):
+    """
+    One recommendation per incident, several incidents per LLM call.
+    """
+    # Several incidents per call, packed by token budget
+    batches = plan_batches(
+        reports, lambda incident: encode_row(incident, PROMPT_FIELDS), OUTPUT_TOKENS_PER_INCIDENT,
+        prompt_tokens=template_tokens(prompt, LLM_MODEL), model=LLM_MODEL
+    )
+    results = run_batches(
+        batches, prompt, "incidents", lambda batch: encode_table(batch, PROMPT_FIELDS), "incidents", "incidents"
+    )
+
+    for batch, items in zip(batches, results):
+        for incident, item in zip(batch, items):
+            if item is None:
+                print(f"[LLM Response Recommender] Error for {incident.get('incident_id')}: no recommendation returned")
+                incident["recommended_actions"] = list(FALLBACK_ACTIONS)
+                incident["why_these_recommendations"] = FALLBACK_REASONING
+            else:
+                incident["recommended_actions"] = item["recommended_actions"]
+                incident["why_these_recommendations"] = item["why_these_recommendations"]
+
+
+def recommend_by_signature(reports):
+    """
+    One playbook per incident signature (SIGNATURE_FIELDS), from the playbook cache
+    or the LLM, shared by every incident of the signature with its own justification.
+    LLM calls scale with the number of new signatures, not incidents.
+    """
+    groups = {}
+    for incident in reports:
+        groups.setdefault(incident_signature(incident), []).append(incident)
+    signatures = list(groups)
+
+    playbooks = {}
+    keys = {}
+    cache = get_playbook_cache() if LLM_CACHE_ENABLED else None
+    if cache is not None:
+        keys = {signature: cache.key(list(signature)) for signature in signatures}
+        found = cache.get_many(list(keys.values()))
+        playbooks = {signature: found[key] for signature, key in keys.items() if key in found}
+    pending = [signature for signature in signatures if signature not in playbooks]
+
+    rows = {signature: signature_row(groups[signature]) for signature in pending}
+    batches = plan_batches(
+        pending, lambda signature: encode_row(rows[signature], PLAYBOOK_FIELDS), OUTPUT_TOKENS_PER_INCIDENT,
+        prompt_tokens=template_tokens(playbook_prompt, LLM_MODEL), model=LLM_MODEL
+    )
+
+    def store(batch, items):
+        # Cached as each call completes, so a failure later in the node keeps the finished batches;
+        # fallback playbooks are used for this run but never cached
+        cache.put_many({
+            keys[signature]: {k: item[k] for k in ("recommended_actions", "why_these_recommendations")}
+            for signature, item in zip(batch, items) if item is not None
+        })
+
+    results = run_batches(
+        batches, playbook_prompt, "signatures",
+        lambda batch: encode_table([rows[signature] for signature in batch], PLAYBOOK_FIELDS), "playbooks", "signatures",
+        on_batch=store if cache is not None else None
+    )
+
+    for batch, items in zip(batches, results):
+        for signature, item in zip(batch, items):
+            if item is None:
+                print(f"[LLM Response Recommender] Error for signature {signature}: no playbook returned")
+                playbooks[signature] = None
+                continue
+            playbooks[signature] = {
+                "recommended_actions": item["recommended_actions"],
+                "why_these_recommendations": item["why_these_recommendations"],
+            }
+
+    for signature, incidents in groups.items():
+        playbook = playbooks[signature]
+        for incident in incidents:
+            if playbook is None:
+                incident["recommended_actions"] = list(FALLBACK_ACTIONS)
+                incident["why_these_recommendations"] = FALLBACK_REASONING
+            else:
+                incident["recommended_actions"] = list(playbook["recommended_actions"])
+                incident["why_these_recommendations"] = justify(incident, playbook["why_these_recommendations"])
+
+    print(f"[LLM Response Recommender] {len(reports)} incidents, {len(signatures)} signatures, "
+          f"{len(signatures) - len(pending)} cached playbooks, {len(batches)} LLM calls")
+
 
 def response_recommender_agent(state):
     """
-    ResponseRecommenderAgent (LLM-Based per-incident): Uses GPT-4.1 to generate
-    tailored response playbooks for each incident individually.
+    ResponseRecommenderAgent (LLM-Based): Uses GPT-4.1 to generate response
+    playbooks for the incidents.
+
+    With RESPONSE_GROUPING="signature" (default), incidents with the same threat
+    type, system and endpoint share one playbook, generated once per signature and
+    cached on disk (llm.cache); each incident still gets its own justification.
+    With "incident", every incident gets its own recommendations. Either way rows
+    are sent several per call as a compact table (llm.codec), packed up to the
+    token budgets in llm.batching, and replies are keyed by row.
+
+    Calls run concurrently (RESPONSE_MAX_IN_FLIGHT) under an adaptive limit that is
+    halved on 429s, the shared rate limiter and a per-call timeout; incidents only
+    get the fallback playbook once their call's retries are exhausted.
 
     Output:
-    - Each incident in 'incident_reports' will contain unique recommended actions and explanation.
+    - Each incident in 'incident_reports' will contain recommended actions and explanation.
     """
     reports = state.get("logs", [])
 
@@ -49,43 +324,10 @@ def response_recommender_agent(state):
         state["why_these_recommendations"] = "Access denied due to insufficient RBAC permissions."
         return state
 
-    chain = prompt | llm
-    all_actions = []
-    reasoning_pool = []
-
-    for incident in reports:
-        try:
-            response = chain.invoke({"incidents": json.dumps([incident])})
-            content = response.content.strip()
-
-            if content.startswith("```json"):
-                content = content[7:].strip()
-            if content.endswith("```"):
-                content = content[:-3].strip()
-
-            parsed = json.loads(content)
-
-            actions = parsed.get("recommended_actions", [])
-            reasoning = parsed.get("why_these_recommendations", "No reasoning provided.")
-
-            if reasoning.startswith("Short explanation: "):
-                reasoning = reasoning[19:].strip()
-
-            incident["recommended_actions"] = actions
-            incident["why_these_recommendations"] = reasoning
-
-            all_actions.extend(actions)
-            reasoning_pool.append(reasoning)
-
-        except Exception as e:
-            print(f"[LLM Response Recommender] Error for {incident.get('incident_id')}: {e}")
-            fallback_actions = ["Escalate to human analyst", "Log and review in audit"]
-            fallback_reason = "Fallback recommendation: LLM analysis failed."
-
-            incident["recommended_actions"] = fallback_actions
-            incident["why_these_recommendations"] = fallback_reason
-            all_actions.extend(fallback_actions)
-            reasoning_pool.append(fallback_reason)
+    if RESPONSE_GROUPING == "incident":
+        recommend_per_incident(reports)
+    else:
+        recommend_by_signature(reports)
 
     # Save the incidents recommendations in the report
     state["logs"] = reports
@@ -0,0 +1,38 @@
+from rules.engine import get_rule_engine
+
+
+def rule_engine_agent(state):
+    """
+    RuleEngineAgent (Deterministic): Applies the compiled detection rules from
+    rules/detection_rules.json ahead of the IsolationForest. Logs that match a rule
+    (e.g. failed-login bursts, after-hours PLP exports) are tagged with the rule's
+    threat type and skip both model scoring and LLM classification.
+
+    Input:
+    - state['logs']: List of LogRecords
+    - state['log_source'] (optional): Streaming source spec; rules are then applied
+      chunk by chunk inside the detector as the source is read
+    - state['windows'] (optional): DetectionWindows whose burst counts carry over from
+      earlier runs (follow mode); otherwise counts start empty for this run
+
+    Output:
+    - state['logs']: LogRecords no rule matched (to be scored by the detector)
+    - state['rule_matches']: Tagged LogRecords matched by a rule
+    """
+    engine = get_rule_engine()
+    state["rule_matches"] = []
+    if not len(engine):
+        return state
+
+    source = state.get("log_source")
+    if source:
+        state["log_source"] = {**source, "rules": True}
+        return state
+
+    logs = state.get("logs", [])
+    matched, unmatched = engine.split(logs, state.get("windows"))
+    print(f"[Rule Engine] {len(matched)} of {len(logs)} logs matched {len(engine)} rules")
+
+    state["rule_matches"] = matched
+    state["logs"] = unmatched
+    return state
@@ -1,31 +1,143 @@
-from ml.model import load_model_and_encoders, extract_features
+import heapq
+import itertools
+import os
+from ml.behavior import DetectionWindows
+from ml.registry import get_registry
+from ml.sharded import score_logs_sharded
+from ingestion.stream import iter_log_chunks
+from ingestion.columnar import iter_columnar_chunks, detection_frame, materialize_rows
+from rules.engine import get_rule_engine
+
+# decision_function cut-off; 0.0 matches model.predict's -1 label
+ANOMALY_SCORE_THRESHOLD = float(os.getenv("ANOMALY_SCORE_THRESHOLD", 0.0))
+
+# Keep only the N most anomalous logs for the LLM stages (0 = no cap)
+ANOMALY_TOP_N = int(os.getenv("ANOMALY_TOP_N", 0))
+
+
+class SuspiciousCollector:
+    """
+    Accumulates flagged logs across chunks with bounded memory.
+
+    Without a cap, flagged logs are kept in input order. With `top_n`, a heap holds
+    only the N lowest-scoring (most anomalous) logs seen so far and `results()`
+    returns them ranked, most anomalous first.
+    """
+
+    def __init__(self, threshold=ANOMALY_SCORE_THRESHOLD, top_n=ANOMALY_TOP_N):
+        self.threshold = threshold
+        self.top_n = top_n
+        self.flagged = 0
+        self.total = 0
+        self._kept = []
+        self._seq = itertools.count()
+
+    def add(self, records, scores):
+        """
+        Adds one scored chunk. `records` is a list of LogRecords or a callable that
+        materializes LogRecords for a list of row indices (columnar batches).
+        """
+        self.total += len(scores)
+        indices = (scores < self.threshold).nonzero()[0]
+        self.flagged += len(indices)
+        if len(indices) == 0:
+            return
+
+        if self.top_n:
+            # Only materialize rows that can still make the cut
+            if len(self._kept) >= self.top_n:
+                worst_kept = -self._kept[0][0]
+                indices = indices[scores[indices] < worst_kept]
+            if len(indices) > self.top_n:
+                indices = indices[scores[indices].argsort(kind="stable")[:self.top_n]]
+
+        flagged = records(indices) if callable(records) else [records[i] for i in indices]
+        for record, i in zip(flagged, indices):
+            record.score = float(scores[i])
+            if not self.top_n:
+                self._kept.append(record)
+            else:
+                # Heap root is the least anomalous kept log; ties keep the earlier log
+                entry = (-record.score, -next(self._seq), record)
+                if len(self._kept) < self.top_n:
+                    heapq.heappush(self._kept, entry)
+                else:
+                    heapq.heappushpop(self._kept, entry)
+
+    def results(self):
+        if not self.top_n:
+            return list(self._kept)
+        return [record for _, _, record in sorted(self._kept, key=lambda e: (-e[0], -e[1]))]
 
 
 def threat_detector_agent(state):
     """
     ThreatDetectorAgent (Model-Based): Loads pre-trained Isolation Forest model and encoders
-    from ml_cache to detect anomalous logs.
+    from ml_cache (via ml.registry, which hot-swaps newly published versions) to detect
+    anomalous logs.
+
+    Logs are scored with `decision_function` in fixed-size batches; each flagged
+    LogRecord carries its `score`. ANOMALY_SCORE_THRESHOLD and ANOMALY_TOP_N cap how
+    many logs reach the LLM stages. With DETECTOR_WORKERS > 1, feature extraction and
+    scoring are sharded across a process pool and merged back in input order.
 
     Input:
-    - state['logs']: List of raw logs
+    - state['logs']: List of LogRecords
+    - state['log_source'] (optional): Streaming source spec passed to `iter_log_chunks`.
+      When set, logs are read and scored chunk by chunk so only one chunk of raw logs
+      is in memory at a time. With `columnar: True` the chunks come from the Arrow
+      cache (built once per source file) instead of re-parsing JSON/CSV. With
+      `rules: True` (set by the rule engine node), rule matches are split off each
+      chunk before scoring and appended to state['rule_matches'].
+    - state['windows'] (optional): DetectionWindows carried over from earlier runs
+      (follow mode); otherwise burst and behavioral windows start empty for this run
 
     Output:
-    - state['logs']: Logs flagged as anomalous
+    - state['logs']: LogRecords flagged as anomalous (ranked when ANOMALY_TOP_N is set)
     """
+    source = state.get("log_source")
     logs = state.get("logs", [])
-    if not logs:
+    if not source and not logs:
         state["logs"] = []
         return state
 
-    # Load model + encoders
-    model, event_encoder = load_model_and_encoders()
-    X = extract_features(logs, event_encoder)
+    # Resolve the active model version once; every chunk of this run is scored with it
+    # even if a newer version is hot-swapped in meanwhile
+    _, _, version = get_registry().get()
+    collector = SuspiciousCollector()
+    windows = state.get("windows") or DetectionWindows()
+    tracker = windows.behavior
+
+    if source:
+        source = dict(source)
+        columnar = source.pop("columnar", False)
+        engine = get_rule_engine() if source.pop("rules", False) else None
+        rule_matches = state.setdefault("rule_matches", [])
+        if columnar:
+            for batch in iter_columnar_chunks(**source):
+                frame = detection_frame(batch)
+                if engine is None:
+                    scores = score_logs_sharded(frame, version=version, tracker=tracker)
+                    collector.add(lambda indices, batch=batch: materialize_rows(batch, indices), scores)
+                    continue
+                matched, rules, unmatched = engine.split_frame(frame, windows)
+                for record, rule in zip(materialize_rows(batch, matched), rules):
+                    record.threat_type, record.rule = rule.threat_type, rule.id
+                    rule_matches.append(record)
+                scores = score_logs_sharded(frame.iloc[unmatched].reset_index(drop=True), version=version, tracker=tracker)
+                # Collector indices are positions among the unmatched rows
+                collector.add(lambda indices, batch=batch, rows=unmatched: materialize_rows(batch, [rows[i] for i in indices]), scores)
+        else:
+            for chunk in iter_log_chunks(**source):
+                if engine is not None:
+                    matched, chunk = engine.split(chunk, windows)
+                    rule_matches.extend(matched)
+                collector.add(chunk, score_logs_sharded(chunk, version=version, tracker=tracker))
+    else:
+        collector.add(logs, score_logs_sharded(logs, version=version, tracker=tracker))
 
-    predictions = model.predict(X)  # -1 = anomaly
-    suspicious = []
-    for i, pred in enumerate(predictions):
-        if pred == -1:
-            suspicious.append({**logs[i]})
+    suspicious = collector.results()
+    print(f"[Threat Detector] Scored {collector.total} logs, {collector.flagged} flagged, {len(suspicious)} kept")
 
     state["logs"] = suspicious
 
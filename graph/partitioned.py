@@ -0,0 +1,199 @@
+"""
+Map-reduce execution of the detection graph over log partitions.
+
+`build_partitioned_graph()` (graph.flow) runs `rules` and `audit` once over the
+whole input, then fans out with langgraph's Send: each partition of the logs runs
+detect → coalesce → context → response on its own, in parallel, and the
+partitions' incidents are reduced (concatenated) into one report:
+
+    rules → audit → partition × N → report
+
+Without RBAC, partitions stop after context and no report is written.
+
+The rule engine runs before the split because its burst windows need every log
+of a key in time order; its matches are partitioned with the logs. Anomaly
+thresholds, ANOMALY_TOP_N, log coalescing and behavioral feature windows apply per
+partition.
+
+Partitions run on a pluggable executor (PARTITION_EXECUTOR): "thread" runs each
+partition in the langgraph worker thread that received it (LLM calls overlap,
+CPU work shares the GIL); "process" hands each partition to a process pool so
+detection and feature extraction scale across cores. Pool processes have their
+own LLM rate limiters, so set LLM_RPM / LLM_TPM per process accordingly.
+"""
+import atexit
+import os
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from langgraph.types import Send
+from graph.nodes.threat_detector import threat_detector_agent
+from graph.nodes.log_coalescer import log_coalescer_agent
+from graph.nodes.incident_manager import incident_manager_agent
+from graph.nodes.response_recommender import response_recommender_agent
+from graph.nodes.report_generator import report_generator
+
+# How logs are split: "file" (source file), "time" (PARTITION_WINDOW_SECONDS windows) or "user" (hash of user)
+PARTITION_BY = os.getenv("PARTITION_BY", "user")
+
+# Number of user-hash buckets when partitioning by user
+PARTITION_COUNT = int(os.getenv("PARTITION_COUNT", 8))
+
+# Width of a time partition, in seconds
+PARTITION_WINDOW_SECONDS = int(os.getenv("PARTITION_WINDOW_SECONDS", 3600))
+
+# "thread" or "process" (see module docstring)
+PARTITION_EXECUTOR = os.getenv("PARTITION_EXECUTOR", "thread")
+
+# Partitions processed at once (langgraph max_concurrency and process pool size)
+PARTITION_WORKERS = int(os.getenv("PARTITION_WORKERS", os.cpu_count() or 1))
+
+
+def partition_key(record, by=PARTITION_BY, count=PARTITION_COUNT, window=PARTITION_WINDOW_SECONDS):
+    if by == "file":
+        return record.source or "unknown"
+    if by == "time":
+        if record.ts is None:
+            return "time:none"
+        start = record.ts - record.ts % window
+        return f"time:{start}"
+    if by == "user":
+        # crc32 rather than hash(): stable across processes and runs
+        return f"user:{zlib.crc32((record.user or '').encode('utf-8')) % count}"
+    raise ValueError(f"Unknown partitioning: {by}")
+
+
+def partition_logs(logs, rule_matches=(), by=PARTITION_BY, count=PARTITION_COUNT, window=PARTITION_WINDOW_SECONDS):
+    """
+    Splits logs and rule matches by `partition_key`; returns {key: (logs, rule_matches)}
+    in key order, each list keeping its input order.
+    """
+    partitions = {}
+    for index, records in enumerate((logs, rule_matches)):
+        for record in records:
+            key = partition_key(record, by, count, window)
+            partitions.setdefault(key, ([], []))[index].append(record)
+    return dict(sorted(partitions.items()))
+
+
+def process_partition(logs, rule_matches, rbac_passed):
+    """
+    detect → coalesce → context (→ response when RBAC passed) over one partition;
+    returns its incidents. Runs in a langgraph worker thread or a pool process.
+    """
+    state = {"logs": logs, "rule_matches": rule_matches}
+    for node in (threat_detector_agent, log_coalescer_agent, incident_manager_agent):
+        state = node(state)
+    if rbac_passed and state["logs"]:
+        state["rbac_passed"] = True
+        state = response_recommender_agent(state)
+    return state["logs"]
+
+
+class ThreadExecutor:
+    """
+    Runs the partition in the calling langgraph worker thread.
+    """
+
+    def run(self, fn, *args):
+        return fn(*args)
+
+    def shutdown(self):
+        pass
+
+
+class ProcessExecutor:
+    """
+    Runs each partition in a pool process; logs and incidents are pickled across.
+    """
+
+    def __init__(self, workers=PARTITION_WORKERS):
+        self.pool = ProcessPoolExecutor(max_workers=max(1, workers))
+
+    def run(self, fn, *args):
+        return self.pool.submit(fn, *args).result()
+
+    def shutdown(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+# Executor factories by PARTITION_EXECUTOR name; add an entry to plug in another backend
+EXECUTORS = {
+    "thread": ThreadExecutor,
+    "process": ProcessExecutor,
+}
+
+_executor = None
+_executor_kind = None
+_executor_lock = threading.Lock()
+
+
+def get_partition_executor(kind=PARTITION_EXECUTOR):
+    """
+    Process-wide executor of the given kind, replaced when the kind changes.
+    """
+    global _executor, _executor_kind
+    with _executor_lock:
+        if _executor is None or _executor_kind != kind:
+            shutdown_partition_executor()
+            _executor = EXECUTORS[kind]()
+            _executor_kind = kind
+        return _executor
+
+
+def shutdown_partition_executor():
+    global _executor, _executor_kind
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+        _executor_kind = None
+
+
+atexit.register(shutdown_partition_executor)
+
+
+def fan_out(state):
+    """
+    Conditional edge after `audit`: one Send per partition, or straight to the
+    report when there is nothing to process.
+    """
+    partitions = partition_logs(state.get("logs", []), state.get("rule_matches") or [])
+    print(f"[Partitioner] {len(partitions)} partitions by {PARTITION_BY}, executor {PARTITION_EXECUTOR}")
+    if not partitions:
+        return "report"
+    # Created here, before langgraph's worker threads pick up the Sends
+    get_partition_executor()
+    return [
+        Send("partition", {"partition": key, "logs": logs, "rule_matches": rule_matches,
+                           "rbac_passed": state.get("rbac_passed", False)})
+        for key, (logs, rule_matches) in partitions.items()
+    ]
+
+
+def partition_agent(state):
+    """
+    PartitionAgent (map): runs one partition on the configured executor.
+
+    Input:
+    - PartitionState sent by `fan_out`
+
+    Output:
+    - state['partition_incidents']: the partition's incidents (concatenated across
+      partitions by the State reducer)
+    """
+    incidents = get_partition_executor().run(
+        process_partition, state["logs"], state["rule_matches"], state["rbac_passed"]
+    )
+    print(f"[Partitioner] {state['partition']}: {len(state['logs']) + len(state['rule_matches'])} logs -> {len(incidents)} incidents")
+    return {"partition_incidents": incidents}
+
+
+def reduce_report(state):
+    """
+    ReportAgent (reduce): collects the incidents of all partitions into
+    state['logs'] and, when RBAC passed, generates one report from them.
+    """
+    incidents = state.get("partition_incidents") or []
+    if state.get("rbac_passed", False):
+        report_generator({**state, "logs": incidents})
+    return {"logs": incidents}
@@ -0,0 +1,230 @@
+"""
+Pipelined execution of the graph's nodes over micro-batches.
+
+The compiled graph (graph.flow) runs each node over the whole state before the
+next one starts. Here `rules → detect → coalesce` and `audit` run once up front.
+The LLM stages then work on micro-batches connected by bounded queues, each
+stage on up to PIPELINE_STAGE_WORKERS micro-batches at once:
+
+    context (incident_manager) → response (response_recommender) → report entries (embeddings)
+
+While batch 2 is at the classification LLM, batch 1 is already being
+recommended and embedded. A full queue blocks the stage feeding it
+(backpressure), so at most PIPELINE_QUEUE_SIZE batches wait between two stages.
+The report file and MongoDB insert happen once, after the last batch (barrier).
+"""
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from graph.nodes.rule_engine import rule_engine_agent
+from graph.nodes.threat_detector import threat_detector_agent
+from graph.nodes.log_coalescer import log_coalescer_agent
+from graph.nodes.incident_manager import incident_manager_agent
+from graph.nodes.audit_control import audit_control_agent
+from graph.nodes.response_recommender import response_recommender_agent
+from graph.nodes.report_generator import summarize_incidents, write_report
+
+# Log groups (or rule matches) per micro-batch entering the context stage
+PIPELINE_BATCH_SIZE = int(os.getenv("PIPELINE_BATCH_SIZE", 40))
+
+# Micro-batches buffered between two stages before the upstream stage blocks
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 2))
+
+# Micro-batches each stage works on at once (their LLM calls share the rate limiter)
+PIPELINE_STAGE_WORKERS = int(os.getenv("PIPELINE_STAGE_WORKERS", 4))
+
+_DONE = object()
+
+
+class Stage(threading.Thread):
+    """
+    Applies `work` to the items of `inbox`, up to `workers` items at a time, and
+    puts the results on `outbox` in input order. After an error the rest of the
+    inbox is drained, so upstream stages never block on a queue nobody reads;
+    the error is re-raised by `Pipeline.run`.
+    """
+
+    def __init__(self, name, work, inbox, outbox, workers=1):
+        super().__init__(name=f"pipeline-{name}", daemon=True)
+        self.stage = name
+        self.work = work
+        self.inbox = inbox
+        self.outbox = outbox
+        self.workers = max(1, workers)
+        self.error = None
+        self.busy = 0.0
+        self.items = 0
+
+    def _timed(self, item):
+        started = time.perf_counter()
+        result = self.work(item)
+        return result, time.perf_counter() - started
+
+    def _emit(self, future):
+        try:
+            result, seconds = future.result()
+        except BaseException as e:
+            if self.error is None:
+                print(f"[Pipeline] Stage {self.stage} failed: {e}")
+                self.error = e
+            return
+        if self.error is None:
+            self.busy += seconds
+            self.items += 1
+            self.outbox.put(result)
+
+    def run(self):
+        pending = deque()
+        try:
+            with ThreadPoolExecutor(self.workers, thread_name_prefix=f"pipeline-{self.stage}") as pool:
+                while True:
+                    item = self.inbox.get()
+                    if item is _DONE:
+                        break
+                    if self.error is not None:
+                        continue
+                    pending.append(pool.submit(self._timed, item))
+                    # Emit finished results in order; block on the oldest when all workers are busy
+                    while pending and (len(pending) >= self.workers or pending[0].done()):
+                        self._emit(pending.popleft())
+                while pending:
+                    self._emit(pending.popleft())
+        finally:
+            self.outbox.put(_DONE)
+
+
+class Pipeline:
+    """
+    Stages ([(name, work), ...]) connected by queues holding at most `queue_size`
+    items each, every stage working on up to `workers` items at once. `run(items)` yields the last stage's results as they complete, in
+    input order, and raises the first stage error once the pipeline has drained.
+    `stages` keeps the Stage threads of the last run (busy time, item counts).
+    """
+
+    def __init__(self, stages, queue_size=PIPELINE_QUEUE_SIZE, workers=PIPELINE_STAGE_WORKERS):
+        self.spec = stages
+        self.queue_size = max(1, queue_size)
+        self.workers = workers
+        self.stages = []
+
+    @staticmethod
+    def _feed(items, inbox, stop):
+        try:
+            for item in items:
+                if stop.is_set():
+                    break
+                inbox.put(item)
+        finally:
+            inbox.put(_DONE)
+
+    def run(self, items):
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.spec) + 1)]
+        self.stages = [Stage(name, work, queues[i], queues[i + 1], self.workers) for i, (name, work) in enumerate(self.spec)]
+        stop = threading.Event()
+        feeder = threading.Thread(target=self._feed, args=(items, queues[0], stop), name="pipeline-feed", daemon=True)
+        for stage in self.stages:
+            stage.start()
+        feeder.start()
+        done = False
+        try:
+            while not done:
+                result = queues[-1].get()
+                done = result is _DONE
+                if not done:
+                    yield result
+        finally:
+            # If the consumer stopped early: feed no more, let in-flight batches drain
+            stop.set()
+            while not done:
+                done = queues[-1].get() is _DONE
+            feeder.join()
+            for stage in self.stages:
+                stage.join()
+        for stage in self.stages:
+            if stage.error is not None:
+                raise stage.error
+
+
+def micro_batches(state, batch_size=PIPELINE_BATCH_SIZE):
+    """
+    Context-stage inputs: rule matches first (no LLM call, so their incidents
+    come out first), then the coalesced log groups.
+    """
+    rule_matches = state.get("rule_matches") or []
+    for start in range(0, len(rule_matches), batch_size):
+        yield {"logs": [], "rule_matches": rule_matches[start:start + batch_size]}
+    groups = state.get("logs", [])
+    for start in range(0, len(groups), batch_size):
+        yield {"logs": groups[start:start + batch_size], "rule_matches": []}
+
+
+def run_pipelined(state, batch_size=PIPELINE_BATCH_SIZE, queue_size=PIPELINE_QUEUE_SIZE, workers=PIPELINE_STAGE_WORKERS,
+                  store=True, timings=None):
+    """
+    Runs the whole detection flow like `build_graph().invoke(state)`, with the
+    LLM and embedding stages pipelined over micro-batches (see module docstring).
+    Prints time to the first finished incident and the total time. With
+    `store=False` the final report file / MongoDB write is skipped (benchmarks);
+    a `timings` dict receives first_incident / total seconds.
+
+    Returns the final state: state['logs'] holds every incident (with
+    recommendations when RBAC passed), in micro-batch order.
+    """
+    started = time.perf_counter()
+    for node in (rule_engine_agent, threat_detector_agent, log_coalescer_agent):
+        state = node(state)
+
+    # Audit only depends on the analyst, so RBAC is settled before any LLM work
+    state = audit_control_agent(state)
+    rbac_passed = state.get("rbac_passed", False)
+    filename = state.get("report_filename", "Incident Report UNKNOWN.json")
+    report_name = filename.replace(".json", "")
+
+    def classify(batch):
+        return incident_manager_agent(batch)["logs"]
+
+    def recommend(incidents):
+        if not incidents:
+            return incidents
+        return response_recommender_agent({"logs": incidents, "rbac_passed": True})["logs"]
+
+    def summarize(incidents):
+        return incidents, summarize_incidents(incidents, report_name)
+
+    stages = [("context", classify)]
+    if rbac_passed:
+        stages += [("response", recommend), ("report", summarize)]
+
+    pipeline = Pipeline(stages, queue_size, workers)
+    incidents = []
+    summary_report = []
+    first_incident = None
+    batches = 0
+    for result in pipeline.run(micro_batches(state, batch_size)):
+        batches += 1
+        if rbac_passed:
+            result, summaries = result
+            summary_report.extend(summaries)
+        if result and first_incident is None:
+            first_incident = time.perf_counter() - started
+        incidents.extend(result)
+
+    if rbac_passed and store:
+        # Barrier: the report file and MongoDB insert need every incident
+        print("Report Generation: generating report .......")
+        write_report(summary_report, filename)
+
+    total = time.perf_counter() - started
+    busy = ", ".join(f"{stage.stage} {stage.busy:.1f}s" for stage in pipeline.stages)
+    first = f"{first_incident:.1f}s" if first_incident is not None else "n/a"
+    print(f"[Pipeline] {len(incidents)} incidents in {batches} micro-batches; first incident after {first}, "
+          f"total {total:.1f}s (stage busy time: {busy})")
+
+    if timings is not None:
+        timings.update(first_incident=first_incident, total=total, batches=batches)
+
+    state["logs"] = incidents
+    return state
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import pyarrow as pa
+from ingestion.stream import DATA_DIR, CHUNK_SIZE, INGEST_WORKERS, iter_file_records, iter_log_files
+from ingestion.record import LogRecord
+
+# On-disk Arrow IPC cache of parsed logs, one file per source log file
+COLUMNAR_DIR = Path(os.getenv("COLUMNAR_CACHE_DIR", "cache/columnar"))
+
+# Bump when the cache layout changes so stale files are rebuilt
+CACHE_VERSION = b"2"
+
+# Columns the detector reads; everything else stays on disk
+DETECTION_COLUMNS = ["ts", "event", "user", "ip", "endpoint"]
+
+# One column per LogRecord field; `extra` holds unmapped keys as JSON
+SCHEMA = pa.schema(
+    [("ts", pa.int64())]
+    + [(name, pa.string()) for name in ("user", "ip", "endpoint", "event", "action", "system", "message", "level", "source")]
+    + [("extra", pa.string())]
+)
+
+
+def cache_path_for(file_path, cache_dir=COLUMNAR_DIR):
+    """
+    Returns the Arrow cache location for a source file (stable across runs).
+    """
+    key = hashlib.sha256(str(Path(file_path).resolve()).encode("utf-8")).hexdigest()[:16]
+    return Path(cache_dir) / f"{Path(file_path).stem}-{key}.arrow"
+
+
+def _source_fingerprint(file_path):
+    stat = os.stat(file_path)
+    return {
+        b"source": str(file_path).encode("utf-8"),
+        b"size": str(stat.st_size).encode(),
+        b"mtime_ns": str(stat.st_mtime_ns).encode(),
+        b"version": CACHE_VERSION,
+    }
+
+
+def _is_fresh(cache_path, fingerprint):
+    try:
+        with pa.memory_map(str(cache_path), "r") as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+    except (FileNotFoundError, pa.ArrowInvalid):
+        return False
+    return all(metadata.get(k) == v for k, v in fingerprint.items() if k != b"source")
+
+
+def _to_batch(records, fingerprint):
+    columns = []
+    for field in SCHEMA:
+        if field.name == "extra":
+            values = [json.dumps(r.extra) if r.extra else None for r in records]
+        else:
+            values = [getattr(r, field.name) for r in records]
+            if pa.types.is_string(field.type):
+                # Non-string values (e.g. a numeric or object `message`) are stringified, as `_intern` does
+                values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+        columns.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(columns, schema=SCHEMA.with_metadata(fingerprint))
+
+
+def build_columnar_cache(file_path, cache_dir=COLUMNAR_DIR, chunk_size=CHUNK_SIZE):
+    """
+    Converts one raw JSON/CSV log file into an uncompressed Arrow IPC file, streaming
+    `chunk_size` records at a time. Skipped when the cache already matches the
+    source size and mtime.
+
+    Returns:
+    - Path of the Arrow cache file
+    """
+    cache_path = cache_path_for(file_path, cache_dir)
+    fingerprint = _source_fingerprint(file_path)
+    if _is_fresh(cache_path, fingerprint):
+        return cache_path
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(".arrow.tmp")
+    schema = SCHEMA.with_metadata(fingerprint)
+
+    try:
+        with pa.OSFile(str(tmp_path), "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+            records = []
+            for record in iter_file_records(file_path):
+                records.append(record)
+                if len(records) >= chunk_size:
+                    writer.write_batch(_to_batch(records, fingerprint))
+                    records = []
+            if records:
+                writer.write_batch(_to_batch(records, fingerprint))
+    except BaseException:
+        # A half-written cache file is never reused; don't leave it behind
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def _build_cache_safe(file_path, cache_dir, chunk_size):
+    try:
+        return build_columnar_cache(file_path, cache_dir, chunk_size), None
+    except Exception as e:
+        return None, str(e)
+
+
+def build_columnar_caches(files, cache_dir=COLUMNAR_DIR, chunk_size=CHUNK_SIZE, workers=INGEST_WORKERS):
+    """
+    Builds (or reuses) the Arrow cache for every file, optionally in a process pool.
+    Yields (source_path, cache_path) in input order; failed files are reported and skipped.
+    """
+    files = list(files)
+    if workers and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_build_cache_safe, files, [cache_dir] * len(files), [chunk_size] * len(files)))
+    else:
+        results = [_build_cache_safe(f, cache_dir, chunk_size) for f in files]
+
+    for file_path, (cache_path, error) in zip(files, results):
+        if error:
+            print(f"Error caching {file_path}: {error}")
+            continue
+        yield file_path, cache_path
+
+
+def iter_columnar_chunks(data_dir=DATA_DIR, chunk_size=CHUNK_SIZE, paths=None, workers=INGEST_WORKERS, cache_dir=COLUMNAR_DIR):
+    """
+    Streams logs as Arrow RecordBatches of at most `chunk_size` rows, read through
+    a memory map of the columnar cache (zero-copy; pages load on first touch).
+
+    Detection should only touch DETECTION_COLUMNS; use `materialize_rows` to build
+    LogRecords for the rows it keeps.
+    """
+    files = paths if paths is not None else iter_log_files(data_dir)
+
+    for _, cache_path in build_columnar_caches(files, cache_dir, chunk_size, workers):
+        with pa.memory_map(str(cache_path), "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+            for batch in table.to_batches(max_chunksize=chunk_size):
+                yield batch
+
+
+def detection_frame(batch):
+    """
+    Returns only the detection columns of a batch as a pandas DataFrame.
+    """
+    return batch.select(DETECTION_COLUMNS).to_pandas()
+
+
+def materialize_rows(batch, indices):
+    """
+    Builds LogRecords for the given row indices of a batch.
+    """
+    if len(indices) == 0:
+        return []
+    records = []
+    for row in batch.take(pa.array(indices)).to_pylist():
+        extra = row.pop("extra")
+        records.append(LogRecord(extra=json.loads(extra) if extra else None, **row))
+    return records
@@ -0,0 +1,252 @@
+import csv
+import json
+import os
+import time
+from pathlib import Path
+from ingestion.stream import DATA_DIR, JSON_SUFFIXES, CSV_SUFFIXES, iter_json_records, iter_log_files
+from ingestion.record import normalize_records
+
+# Per-file read positions, persisted so a restarted follower resumes where it stopped
+OFFSETS_PATH = Path(os.getenv("FOLLOW_OFFSETS_PATH", "cache/follow_offsets.json"))
+
+# Max records per micro-batch sent through the graph
+FOLLOW_BATCH_SIZE = int(os.getenv("FOLLOW_BATCH_SIZE", 1000))
+
+# Max seconds a non-empty buffer waits before being flushed
+FOLLOW_FLUSH_SECONDS = float(os.getenv("FOLLOW_FLUSH_SECONDS", 5))
+
+# Seconds to sleep between scans when nothing new arrived
+FOLLOW_POLL_SECONDS = float(os.getenv("FOLLOW_POLL_SECONDS", 1))
+
+# Cap on the wait before retrying a failed batch (the wait doubles from the poll interval)
+FOLLOW_RETRY_MAX_SECONDS = float(os.getenv("FOLLOW_RETRY_MAX_SECONDS", 300))
+
+# Retries of a failing batch before it is set aside in the dead-letter file and skipped
+FOLLOW_MAX_RETRIES = int(os.getenv("FOLLOW_MAX_RETRIES", 5))
+
+# NDJSON file receiving batches that failed every retry (keep it outside the watched directory)
+DEAD_LETTER_PATH = Path(os.getenv("FOLLOW_DEAD_LETTER_PATH", "cache/follow_dead_letter.jsonl"))
+
+LINE_SUFFIXES = {".jsonl", ".ndjson"}
+
+
+def _parse_json_line(text):
+    record = json.loads(text)
+    if not isinstance(record, dict):
+        raise ValueError(f"expected a JSON object, got {type(record).__name__}")
+    return record
+
+
+class LogFollower:
+    """
+    Tails every log file under a directory and returns only newly appended records.
+
+    Tracking per file:
+    - NDJSON (.jsonl/.ndjson): byte offset of the last complete line read
+    - CSV: byte offset plus the header row, so appended rows parse without it
+    - JSON arrays (.json): number of records already read, since arrays can't be
+      appended to in place; a grown file is re-streamed and the seen prefix skipped
+
+    A file that shrinks or is replaced (new inode) is read again from the start.
+    Offsets advance in memory on `poll()` and are only persisted by `commit()`,
+    so records from a batch that failed are re-read after a restart.
+    """
+
+    def __init__(self, watch_dir=DATA_DIR, offsets_path=OFFSETS_PATH):
+        self.watch_dir = Path(watch_dir)
+        self.offsets_path = Path(offsets_path)
+        self.committed = self._load_offsets()
+        self.pending = {path: dict(entry) for path, entry in self.committed.items()}
+
+    def _load_offsets(self):
+        try:
+            with open(self.offsets_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Ignoring unreadable follow offsets {self.offsets_path}: {e}")
+            return {}
+
+    def commit(self):
+        """
+        Persists the offsets of everything returned by `poll()` so far.
+        """
+        self.committed = {path: dict(entry) for path, entry in self.pending.items()}
+        self.offsets_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.offsets_path.with_suffix(self.offsets_path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.committed, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.offsets_path)
+
+    def poll(self, max_records=FOLLOW_BATCH_SIZE):
+        """
+        Returns up to `max_records` LogRecords appended since the last poll, across all files.
+        """
+        records = []
+        for file_path in iter_log_files(self.watch_dir):
+            if len(records) >= max_records:
+                break
+            try:
+                new_records = self._read_new(file_path, max_records - len(records))
+                records.extend(normalize_records(new_records, file_path.name))
+            except Exception as e:
+                print(f"Error following {file_path}: {e}")
+        return records
+
+    def _read_new(self, file_path, limit):
+        key = str(file_path)
+        stat = os.stat(file_path)
+        entry = self.pending.get(key)
+
+        if entry is None or entry["inode"] != stat.st_ino or stat.st_size < max(entry["offset"], entry["size"]):
+            entry = {"inode": stat.st_ino, "size": 0, "offset": 0, "records": 0, "header": None}
+        if stat.st_size == entry["size"]:
+            self.pending[key] = entry
+            return []
+
+        suffix = file_path.suffix.lower()
+        if suffix in LINE_SUFFIXES:
+            records = self._read_lines(file_path, entry, limit, _parse_json_line)
+        elif suffix in CSV_SUFFIXES:
+            records = self._read_csv(file_path, entry, limit)
+        elif suffix in JSON_SUFFIXES:
+            records = self._read_json_array(file_path, entry, limit)
+        else:
+            records = []
+
+        self.pending[key] = entry
+        return records
+
+    def _read_lines(self, file_path, entry, limit, parse):
+        """
+        Reads complete lines after entry['offset']; a trailing partial line is left
+        for the next poll. A line that fails to parse is logged and skipped.
+        """
+        records = []
+        with open(file_path, "rb") as f:
+            f.seek(entry["offset"])
+            offset = entry["offset"]
+            while len(records) < limit:
+                line = f.readline()
+                if not line or not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                try:
+                    text = line.decode("utf-8").strip()
+                    record = parse(text) if text else None
+                except Exception as e:
+                    print(f"Skipping unparseable line at {file_path}:{offset - len(line)}: {e}: {line[:200]!r}")
+                    continue
+                if record is not None:
+                    records.append(record)
+            entry["offset"] = offset
+            # Fully consumed once the offset reaches EOF; otherwise keep polling this file
+            entry["size"] = offset if offset == os.fstat(f.fileno()).st_size else -1
+        return records
+
+    def _read_csv(self, file_path, entry, limit):
+        def parse(text):
+            row = next(csv.reader([text]))
+            if entry["header"] is None:
+                entry["header"] = [h.strip() for h in row]
+                return None
+            return {k: v.strip() for k, v in zip(entry["header"], row)}
+
+        return self._read_lines(file_path, entry, limit, parse)
+
+    def _read_json_array(self, file_path, entry, limit):
+        """
+        Re-streams a grown JSON file and returns records past the ones already seen.
+        Only complete, parseable files are consumed, so a half-written array is retried.
+        """
+        try:
+            records = []
+            for i, record in enumerate(iter_json_records(file_path)):
+                if i < entry["records"]:
+                    continue
+                if len(records) >= limit:
+                    entry["records"] += len(records)
+                    entry["size"] = -1
+                    return records
+                records.append(record)
+        except (ValueError, json.JSONDecodeError):
+            return []
+
+        entry["records"] += len(records)
+        entry["size"] = os.stat(file_path).st_size
+        return records
+
+
+def write_dead_letter(records, error, path=DEAD_LETTER_PATH):
+    """
+    Appends the records of a batch that kept failing to an NDJSON file, one line per
+    record with its source file and the error, for inspection or replay.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    failed_at = time.strftime("%Y-%m-%d %H:%M:%S")
+    error = f"{type(error).__name__}: {error}"
+    with open(path, "a", encoding="utf-8") as f:
+        for record in records:
+            entry = {"failed_at": failed_at, "error": error, "source": record.source, "record": record.to_dict()}
+            f.write(json.dumps(entry, default=str) + "\n")
+
+
+def follow_logs(on_batch, watch_dir=DATA_DIR, batch_size=FOLLOW_BATCH_SIZE,
+                flush_interval=FOLLOW_FLUSH_SECONDS, poll_interval=FOLLOW_POLL_SECONDS,
+                offsets_path=OFFSETS_PATH, max_retries=FOLLOW_MAX_RETRIES, dead_letter_path=DEAD_LETTER_PATH):
+    """
+    Long-running follow loop: watches `watch_dir` and calls `on_batch(records)` with
+    micro-batches of newly appended records.
+
+    A batch is flushed once it reaches `batch_size` records or once the oldest
+    buffered record has waited `flush_interval` seconds. Offsets are committed after
+    `on_batch` returns, giving at-least-once delivery across restarts.
+
+    If `on_batch` raises (MongoDB, LLM or graph error), the error is logged, the
+    offsets stay uncommitted and the same batch is retried after `poll_interval`
+    seconds, doubling on each further failure up to FOLLOW_RETRY_MAX_SECONDS.
+    After `max_retries` retries the batch is appended to `dead_letter_path`, its
+    offsets are committed and following carries on with new records.
+    """
+    follower = LogFollower(watch_dir, offsets_path)
+    buffer = []
+    buffered_since = None
+    failures = 0
+    print(f"[Follow] Watching {watch_dir} (batch={batch_size}, flush={flush_interval}s)")
+
+    try:
+        while True:
+            # While a batch is failing, retry exactly that batch
+            new_records = follower.poll(max_records=batch_size - len(buffer)) if not failures else []
+            if new_records:
+                if buffered_since is None:
+                    buffered_since = time.monotonic()
+                buffer.extend(new_records)
+
+            due = buffered_since is not None and time.monotonic() - buffered_since >= flush_interval
+            if buffer and (failures or len(buffer) >= batch_size or due):
+                print(f"[Follow] Flushing {len(buffer)} new records")
+                try:
+                    on_batch(buffer)
+                except Exception as e:
+                    failures += 1
+                    if failures <= max_retries:
+                        delay = min(poll_interval * 2 ** (failures - 1), FOLLOW_RETRY_MAX_SECONDS)
+                        print(f"[Follow] Batch failed ({type(e).__name__}: {e}); retry {failures}/{max_retries} in {delay:.1f}s")
+                        time.sleep(delay)
+                        continue
+                    write_dead_letter(buffer, e, dead_letter_path)
+                    print(f"[Follow] Batch failed {failures} times ({type(e).__name__}: {e}); "
+                          f"{len(buffer)} records moved to {dead_letter_path}")
+                follower.commit()
+                buffer = []
+                buffered_since = None
+                failures = 0
+                continue
+
+            if not new_records:
+                time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print(f"[Follow] Stopped; {len(buffer)} unflushed records will be re-read on restart")
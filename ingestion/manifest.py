@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+# Records which log files were fully processed by the last successful run
+MANIFEST_PATH = Path(os.getenv("INGEST_MANIFEST_PATH", "cache/ingest_manifest.json"))
+
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def hash_file(file_path):
+    """
+    Returns the SHA-256 hex digest of a file's content, read in fixed-size blocks.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path=MANIFEST_PATH):
+    """
+    Loads the ingestion manifest: {path: {"size", "mtime_ns", "sha256"}}.
+    A missing or corrupt manifest is treated as empty (everything is new).
+    """
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"Ignoring unreadable manifest {manifest_path}: {e}")
+        return {}
+
+
+def save_manifest(manifest, manifest_path=MANIFEST_PATH):
+    """
+    Atomically writes the manifest so a crash never leaves a half-written file.
+    """
+    manifest_path = Path(manifest_path)
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = manifest_path.with_suffix(manifest_path.suffix + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def find_changed_files(paths, manifest):
+    """
+    Splits `paths` into files that changed since the manifest was written.
+
+    Size and mtime are checked first; the content hash is only computed when
+    they differ, so unchanged files cost a single stat() call. A file whose
+    mtime moved but whose content hash is identical counts as unchanged.
+
+    Returns:
+    - changed: list of paths to ingest
+    - fingerprints: {path: fingerprint} for every file seen, to be merged into
+      the manifest once the run succeeds
+    """
+    changed = []
+    fingerprints = {}
+
+    for file_path in paths:
+        key = str(file_path)
+        stat = os.stat(file_path)
+        previous = manifest.get(key)
+
+        if previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns:
+            fingerprints[key] = previous
+            continue
+
+        fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": hash_file(file_path)}
+        fingerprints[key] = fingerprint
+        if not previous or previous["sha256"] != fingerprint["sha256"]:
+            changed.append(file_path)
+
+    return changed, fingerprints
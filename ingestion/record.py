@@ -0,0 +1,205 @@
+import sys
+from datetime import date, datetime, timezone
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Source keys (JSON feeds, CSV exports) mapped onto normalized fields; first match wins
+FIELD_ALIASES = {
+    "timestamp": ("timestamp", "TIMESTAMP"),
+    "user": ("user", "USER", "username"),
+    "ip": ("ip", "IP", "source_ip"),
+    "endpoint": ("endpoint", "ENDPOINT"),
+    "event": ("event", "EVENT"),
+    "action": ("action", "ACTION"),
+    "system": ("HOSTNAME", "hostname", "system"),
+    "message": ("MESSAGE", "message"),
+    "level": ("LEVEL", "level"),
+}
+
+_KNOWN_KEYS = {alias for aliases in FIELD_ALIASES.values() for alias in aliases}
+
+# Low-cardinality fields that repeat across millions of records
+_INTERNED = ("user", "ip", "endpoint", "event", "action", "system", "level", "source")
+_INTERNED_FIELDS = frozenset(_INTERNED)
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# "YYYY-MM-DD" -> epoch seconds at midnight UTC; logs span few distinct days
+_day_seconds = {}
+
+# Key tuple of a raw record -> (field aliases present, extra keys); records from one feed share a plan
+_plans = {}
+
+
+def parse_timestamp(value):
+    """
+    Parses a log timestamp into integer epoch seconds. Naive timestamps are taken as UTC.
+    Returns None when the value is missing or unparseable.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if len(value) == 19 and value[10] == " " and value[13] == ":" and value[16] == ":":
+        # Fast path for the feeds' "%Y-%m-%d %H:%M:%S" format
+        day = value[:10]
+        base = _day_seconds.get(day)
+        try:
+            if base is None:
+                base = (date.fromisoformat(day).toordinal() - _EPOCH_ORDINAL) * 86400
+                _day_seconds[day] = base
+            return base + int(value[11:13]) * 3600 + int(value[14:16]) * 60 + int(value[17:19])
+        except ValueError:
+            return None
+    try:
+        dt = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def format_timestamp(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def _intern(value):
+    if value is None:
+        return None
+    return sys.intern(value) if isinstance(value, str) else sys.intern(str(value))
+
+
+def _plan_for(keys):
+    """
+    Resolves which raw keys feed which LogRecord slot for one key layout:
+    ((slot index or -1 for the timestamp, aliases present, intern?), ...), extra keys.
+    """
+    plan = _plans.get(keys)
+    if plan is None:
+        present = set(keys)
+        fields = tuple(
+            (
+                -1 if field == "timestamp" else LogRecord.__slots__.index(field),
+                tuple(alias for alias in aliases if alias in present),
+                field in _INTERNED_FIELDS,
+            )
+            for field, aliases in FIELD_ALIASES.items()
+            if any(alias in present for alias in aliases)
+        )
+        extra_keys = tuple(k for k in keys if k not in _KNOWN_KEYS)
+        plan = (fields, extra_keys)
+        _plans[keys] = plan
+    return plan
+
+
+class LogRecord:
+    """
+    Normalized log entry produced once at ingestion.
+
+    JSON feeds (timestamp/user/ip/event) and CSV exports (TIMESTAMP/HOSTNAME/MESSAGE/LEVEL)
+    map onto the same fields, so downstream nodes use attributes rather than guessing keys.
+    Categorical fields are interned and the timestamp is stored as epoch seconds (`ts`).
+    Keys that don't map to a field are kept in `extra`; `score` is the anomaly score
+    set by the detector (lower = more anomalous). `threat_type` and `rule` are set
+    when a deterministic detection rule matched the log.
+    """
+
+    __slots__ = ("ts", "user", "ip", "endpoint", "event", "action", "system", "message", "level", "source", "extra",
+                 "score", "threat_type", "rule")
+
+    def __init__(self, ts=None, user=None, ip=None, endpoint=None, event=None, action=None,
+                 system=None, message=None, level=None, source=None, extra=None, score=None,
+                 threat_type=None, rule=None):
+        self.ts = ts
+        self.user = user
+        self.ip = ip
+        self.endpoint = endpoint
+        self.event = event
+        self.action = action
+        self.system = system
+        self.message = message
+        self.level = level
+        self.source = source
+        self.extra = extra
+        self.score = score
+        self.threat_type = threat_type
+        self.rule = rule
+
+    @classmethod
+    def from_raw(cls, raw, source=None):
+        """
+        Builds a record from a raw JSON/CSV dict.
+        """
+        if isinstance(raw, LogRecord):
+            return raw
+
+        fields, extra_keys = _plan_for(tuple(raw))
+        values = [None] * _SLOT_COUNT
+        raw_ts = None
+        for index, aliases, interned in fields:
+            for alias in aliases:
+                value = raw[alias]
+                if value is not None and value != "":
+                    if interned:
+                        value = sys.intern(value) if value.__class__ is str else _intern(value)
+                    if index < 0:
+                        raw_ts = value
+                    else:
+                        values[index] = value
+                    break
+
+        ts = parse_timestamp(raw_ts)
+        values[0] = ts
+        values[_SOURCE_INDEX] = source if source is None else sys.intern(source)
+        if extra_keys or (ts is None and raw_ts is not None):
+            extra = {k: raw[k] for k in extra_keys}
+            if ts is None and raw_ts is not None:
+                # Keep unparseable timestamps verbatim for the report
+                extra["timestamp"] = raw_ts
+            values[_EXTRA_INDEX] = extra
+
+        return cls(*values)
+
+    @property
+    def timestamp(self):
+        """
+        Timestamp as "%Y-%m-%d %H:%M:%S" (UTC), or the raw value if it couldn't be parsed.
+        """
+        if self.ts is not None:
+            return format_timestamp(self.ts)
+        return self.extra.get("timestamp") if self.extra else None
+
+    @property
+    def hour(self):
+        return (self.ts // 3600) % 24 if self.ts is not None else 0
+
+    def to_dict(self):
+        """
+        Normalized JSON-safe view used for LLM prompts and reports; empty fields are omitted.
+        """
+        data = {"timestamp": self.timestamp}
+        for field in ("user", "ip", "endpoint", "action", "event", "system", "message", "level"):
+            data[field] = getattr(self, field)
+        if self.extra:
+            data.update((k, v) for k, v in self.extra.items() if k not in data)
+        return {k: v for k, v in data.items() if v is not None}
+
+    def __reduce__(self):
+        # Compact pickling for process-pool transfer
+        return (LogRecord, tuple(getattr(self, slot) for slot in self.__slots__))
+
+    def __repr__(self):
+        return f"LogRecord({self.to_dict()!r})"
+
+
+_SLOT_COUNT = len(LogRecord.__slots__)
+_SOURCE_INDEX = LogRecord.__slots__.index("source")
+_EXTRA_INDEX = LogRecord.__slots__.index("extra")
+
+
+def normalize_records(raw_records, source=None):
+    """
+    Converts an iterable of raw dicts into LogRecords.
+    """
+    return [LogRecord.from_raw(raw, source) for raw in raw_records]
@@ -0,0 +1,212 @@
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from csvtojson import iter_csv_rows
+from ingestion.record import LogRecord
+
+DATA_DIR = Path("data")
+
+# Max records held in memory per chunk handed to the graph
+CHUNK_SIZE = int(os.getenv("LOG_CHUNK_SIZE", 5000))
+
+# Worker processes used to parse files concurrently (1 = parse in-process)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 1))
+
+# Bytes read from disk per refill of the JSON parse buffer
+READ_SIZE = 1 << 16
+
+JSON_SUFFIXES = {".json", ".jsonl", ".ndjson"}
+CSV_SUFFIXES = {".csv"}
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+def iter_json_records(file_path):
+    """
+    Incrementally parses a JSON log file and yields one record at a time.
+
+    Supports:
+    - A top-level JSON array of records (streamed element by element)
+    - A single top-level JSON object
+    - NDJSON / concatenated JSON objects (one record per value)
+
+    Memory use is bounded by the largest single record plus READ_SIZE,
+    not by the size of the file.
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        buf = ""
+        pos = 0
+        eof = False
+
+        def fill():
+            nonlocal buf, pos, eof
+            data = f.read(READ_SIZE)
+            if not data:
+                eof = True
+                return False
+            buf = buf[pos:] + data
+            pos = 0
+            return True
+
+        def skip_ws():
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in _WHITESPACE:
+                    pos += 1
+                if pos < len(buf) or not fill():
+                    return
+
+        def decode_value():
+            nonlocal pos
+            while True:
+                try:
+                    value, end = _decoder.raw_decode(buf, pos)
+                    # A value ending exactly at the buffer edge may be truncated (e.g. a number)
+                    if end < len(buf) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                if not fill():
+                    value, pos = _decoder.raw_decode(buf, pos)
+                    return value
+
+        skip_ws()
+        if pos >= len(buf):
+            return
+
+        if buf[pos] == "[":
+            pos += 1
+            skip_ws()
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            while True:
+                value = decode_value()
+                if isinstance(value, dict):
+                    yield value
+                skip_ws()
+                if pos >= len(buf):
+                    raise ValueError(f"Unterminated JSON array in {file_path}")
+                sep = buf[pos]
+                pos += 1
+                if sep == "]":
+                    return
+                if sep != ",":
+                    raise ValueError(f"Expected ',' or ']' in {file_path}, got {sep!r}")
+                skip_ws()
+        else:
+            while pos < len(buf):
+                value = decode_value()
+                if isinstance(value, dict):
+                    yield value
+                elif isinstance(value, list):
+                    yield from (v for v in value if isinstance(v, dict))
+                skip_ws()
+
+
+def iter_raw_records(file_path):
+    """
+    Yields raw log dicts from a single JSON/NDJSON/CSV file.
+    Unsupported file types yield nothing.
+    """
+    file_path = Path(file_path)
+    suffix = file_path.suffix.lower()
+    if suffix in JSON_SUFFIXES:
+        yield from iter_json_records(file_path)
+    elif suffix in CSV_SUFFIXES:
+        yield from iter_csv_rows(str(file_path))
+
+
+def iter_file_records(file_path):
+    """
+    Yields normalized LogRecords from a single log file, tagged with its file name.
+    """
+    source = Path(file_path).name
+    for raw in iter_raw_records(file_path):
+        yield LogRecord.from_raw(raw, source)
+
+
+def iter_log_files(data_dir=DATA_DIR):
+    """
+    Yields every supported log file under data_dir (including subfolders) in a stable order.
+    """
+    for file_path in sorted(Path(data_dir).rglob("*")):
+        if file_path.is_file() and file_path.suffix.lower() in JSON_SUFFIXES | CSV_SUFFIXES:
+            yield file_path
+
+
+def load_file_records(file_path):
+    """
+    Parses one whole file in a worker process. Errors are returned rather than
+    raised so one bad file doesn't cancel the rest of the pool.
+    """
+    try:
+        return list(iter_file_records(file_path)), None
+    except Exception as e:
+        return [], str(e)
+
+
+def iter_parsed_files_parallel(files, workers):
+    """
+    Parses files concurrently in a process pool and yields (path, records, error)
+    in input order. At most 2 * workers parsed files are held at once.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for file_path in files:
+            pending.append((file_path, executor.submit(load_file_records, file_path)))
+            if len(pending) >= workers * 2:
+                path, future = pending.popleft()
+                yield (path, *future.result())
+        while pending:
+            path, future = pending.popleft()
+            yield (path, *future.result())
+
+
+def iter_log_chunks(data_dir=DATA_DIR, chunk_size=CHUNK_SIZE, paths=None, workers=INGEST_WORKERS):
+    """
+    Streams all logs under data_dir (or the explicit `paths`) as lists of at most
+    `chunk_size` records. Peak memory depends on chunk_size, not on total log volume.
+
+    With workers > 1, whole files are parsed concurrently in a process pool and
+    re-chunked in file order; peak memory then also includes the files in flight.
+
+    A file that fails to parse is reported and skipped; in single-process mode
+    records already yielded from it are kept.
+    """
+    chunk = []
+    files = paths if paths is not None else iter_log_files(data_dir)
+
+    if workers and workers > 1:
+        for file_path, records, error in iter_parsed_files_parallel(files, workers):
+            if error:
+                print(f"Error loading {file_path}: {error}")
+                continue
+            start = 0
+            while start < len(records):
+                take = chunk_size - len(chunk)
+                chunk.extend(records[start:start + take])
+                start += take
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+        return
+
+    for file_path in files:
+        try:
+            for record in iter_file_records(file_path):
+                chunk.append(record)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+        except Exception as e:
+            print(f"Error loading {file_path}: {e}")
+
+    if chunk:
+        yield chunk
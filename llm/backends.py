@@ -0,0 +1,256 @@
+"""
+Chat model and embedding providers shared by the graph nodes and the chat API.
+
+LLM_BACKEND selects the implementation:
+- "openai" (default): ChatOpenAI / OpenAIEmbeddings with OPENAI_API_KEY.
+- "local": a deterministic offline stand-in. Chat replies are canned, schema-valid
+  classifications or recommendations for the table rows in the prompt (llm.codec);
+  embeddings are hash-seeded vectors. Latency and failures are simulated, so every
+  node can be run, load-tested and benchmarked without the network.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Any, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from llm.codec import DELIMITER, decode_table
+from llm.concurrency import estimate_tokens
+from dotenv import load_dotenv
+load_dotenv()
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai").lower()
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = 1536
+
+# Simulated latency of the local backend: seconds per call, plus seconds per reply token
+LOCAL_LLM_LATENCY = float(os.getenv("LOCAL_LLM_LATENCY", 0.0))
+LOCAL_LLM_SECONDS_PER_TOKEN = float(os.getenv("LOCAL_LLM_SECONDS_PER_TOKEN", 0.0))
+
+# Fraction of local calls that fail with a retryable error (429 / 500 / 503)
+LOCAL_LLM_FAILURE_RATE = float(os.getenv("LOCAL_LLM_FAILURE_RATE", 0.0))
+
+# Retry-After (seconds) sent with simulated 429s; 0 = no header
+LOCAL_LLM_RETRY_AFTER = float(os.getenv("LOCAL_LLM_RETRY_AFTER", 1.0))
+
+# Simulated latency of one local embedding request, in seconds
+LOCAL_EMBEDDING_LATENCY = float(os.getenv("LOCAL_EMBEDDING_LATENCY", 0.0))
+
+# Seed of the simulated latency jitter and failures, for reproducible load tests
+LOCAL_LLM_SEED = int(os.getenv("LOCAL_LLM_SEED", 0))
+
+_rng = random.Random(LOCAL_LLM_SEED)
+
+
+class LocalBackendError(Exception):
+    """
+    Simulated provider error; carries a status_code like the openai exceptions,
+    so llm.concurrency retries it the same way.
+    """
+
+    def __init__(self, status_code):
+        super().__init__(f"Simulated provider error {status_code}")
+        self.status_code = status_code
+        headers = {"retry-after": str(LOCAL_LLM_RETRY_AFTER)} if status_code == 429 and LOCAL_LLM_RETRY_AFTER else {}
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+
+def _simulated_delay(base, reply=""):
+    # +-25% jitter around the configured latency
+    delay = base + (LOCAL_LLM_SECONDS_PER_TOKEN * estimate_tokens(reply) if reply else 0.0)
+    return delay * _rng.uniform(0.75, 1.25) if delay > 0 else 0.0
+
+
+def _maybe_fail():
+    if LOCAL_LLM_FAILURE_RATE > 0 and _rng.random() < LOCAL_LLM_FAILURE_RATE:
+        raise LocalBackendError(_rng.choice((429, 500, 503)))
+
+
+def _digest(text):
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+
+
+# Canned classification by event, then by endpoint
+LOCAL_THREAT_TYPES = {
+    "FAILED_LOGIN": "brute_force",
+    "MALICIOUS_TRANSFER": "malicious_transfer",
+    "UNKNOWN_ACTIVITY": "unknown_activity",
+}
+
+# Canned playbooks by threat type; "default" covers the rest
+LOCAL_PLAYBOOKS = {
+    "brute_force": ["Block the source IP at the WAF", "Force a password reset for the account",
+                    "Enable MFA for the account", "Review recent sessions for the user"],
+    "malicious_transfer": ["Freeze the transfer and the destination account", "Suspend the user's session",
+                           "Notify the fraud team", "Preserve transaction logs for investigation"],
+    "plp_access": ["Revoke the user's PLP export permission", "Review the exported records",
+                   "Confirm the access with the user's manager"],
+    "default": ["Escalate to a SOC analyst for triage", "Correlate with other activity from the source IP",
+                "Log and review in audit"],
+}
+
+
+def _threat_type(row):
+    threat_type = row.get("threat_type")
+    if threat_type:
+        return threat_type.lower().replace(" ", "_")
+    threat_type = LOCAL_THREAT_TYPES.get(row.get("event"))
+    if threat_type is None:
+        threat_type = "plp_access" if "/plp" in (row.get("endpoint") or "") else "unknown_activity"
+    return threat_type
+
+
+def local_classification(row):
+    """
+    Canned incident classification for one decoded table row of the incident
+    manager prompt; the risk score is seeded by the row so reruns agree.
+    """
+    threat_type = _threat_type(row)
+    risk = 3 + _digest(json.dumps(row, sort_keys=True)) % 5
+    if str(row.get("count") or "1") != "1":
+        risk += 2
+    return {
+        "threat_type": threat_type,
+        "affected_system": "internal_plp" if "/plp" in (row.get("endpoint") or "") else (row.get("system") or "mobile_app"),
+        "summary": f"{threat_type.replace('_', ' ').title()} pattern from {row.get('ip') or 'an unknown IP'} "
+                   f"against {row.get('endpoint') or 'the application'} for user {row.get('user') or 'unknown'}.",
+        "impact": "Potential unauthorized access or misuse.",
+        "risk_score": min(risk, 10),
+    }
+
+
+def local_recommendation(row):
+    """
+    Canned playbook for one decoded table row of the response recommender prompt.
+    """
+    threat_type = _threat_type(row)
+    return {
+        "recommended_actions": LOCAL_PLAYBOOKS.get(threat_type, LOCAL_PLAYBOOKS["default"]),
+        "why_these_recommendations": f"Standard containment for {threat_type.replace('_', ' ')} "
+                                     f"with risk score {row.get('risk_score') or 'unknown'}.",
+    }
+
+
+def _prompt_rows(text):
+    # The codec table of a prompt: the first "ref|..." header, its dict line, and the rows up to a blank line
+    lines = text.split("\n")
+    for i, line in enumerate(lines):
+        if line.startswith("ref" + DELIMITER):
+            start = i - 1 if i and lines[i - 1].startswith("dict: ") else i
+            end = i + 1
+            while end < len(lines) and lines[end].strip():
+                end += 1
+            return decode_table("\n".join(lines[start:end]))
+    return None
+
+
+def local_reply(text):
+    """
+    Reply of the local backend to a prompt: {"<list key>": [...]} keyed by ref for
+    the node prompts (the key the prompt's example uses), a short canned answer otherwise.
+    """
+    rows = _prompt_rows(text)
+    if rows is None:
+        return "The local LLM backend is active (LLM_BACKEND=local); no model is available to answer this."
+    answer = local_recommendation if "recommended_actions" in text else local_classification
+    list_key = re.search(r'\{"(\w+)": \[', text)
+    return json.dumps({list_key.group(1) if list_key else "incidents": [dict(answer(row), ref=int(row["ref"])) for row in rows]})
+
+
+class LocalChatModel(BaseChatModel):
+    """
+    Deterministic chat model standing in for ChatOpenAI (see module docstring).
+    """
+
+    model_name: str = "local"
+    temperature: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "local"
+
+    def _reply(self, messages):
+        _maybe_fail()
+        return local_reply(str(messages[-1].content) if messages else "")
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        reply = self._reply(messages)
+        time.sleep(_simulated_delay(LOCAL_LLM_LATENCY, reply))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        reply = self._reply(messages)
+        await asyncio.sleep(_simulated_delay(LOCAL_LLM_LATENCY, reply))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        # Tools are accepted so agents can be built, but the canned replies never call them
+        return self.bind(**kwargs)
+
+
+@lru_cache(maxsize=8192)
+def _token_vector(token, dimensions):
+    return np.random.default_rng(_digest(token)).standard_normal(dimensions)
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    Hash-seeded embeddings: each word maps to a fixed random vector and a text to
+    the normalized sum of its words, so texts sharing words are close in cosine
+    similarity, as with a real embedding model.
+    """
+
+    def __init__(self, dimensions=EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def _embed(self, text):
+        tokens = re.findall(r"\w+", text.lower()) or [text]
+        vector = np.sum([_token_vector(token, self.dimensions) for token in tokens], axis=0)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        _maybe_fail()
+        time.sleep(_simulated_delay(LOCAL_EMBEDDING_LATENCY))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        _maybe_fail()
+        await asyncio.sleep(_simulated_delay(LOCAL_EMBEDDING_LATENCY))
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+
+def get_chat_model(model, temperature=0.0, **kwargs):
+    """
+    Chat model of the configured backend. The local model is named "local:<model>"
+    so cached replies of the two backends never mix.
+    """
+    if LLM_BACKEND == "local":
+        return LocalChatModel(model_name=f"local:{model}", temperature=temperature)
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model=model, temperature=temperature, api_key=os.getenv("OPENAI_API_KEY"), **kwargs)
+
+
+def get_embeddings(model=EMBEDDING_MODEL):
+    """
+    Embedding client of the configured backend (LangChain Embeddings interface).
+    """
+    if LLM_BACKEND == "local":
+        return LocalEmbeddings()
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=model, api_key=os.getenv("OPENAI_API_KEY"))
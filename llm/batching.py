@@ -0,0 +1,102 @@
+import os
+from functools import lru_cache
+from llm.concurrency import estimate_tokens
+
+# Max prompt tokens per LLM call for the serialized records (excludes the template)
+LLM_INPUT_TOKEN_BUDGET = int(os.getenv("LLM_INPUT_TOKEN_BUDGET", 6000))
+
+# Max expected completion tokens per LLM call; keeps JSON replies well under the output cap
+LLM_OUTPUT_TOKEN_BUDGET = int(os.getenv("LLM_OUTPUT_TOKEN_BUDGET", 4000))
+
+# Context windows (prompt + completion) of the models the nodes use
+MODEL_CONTEXT_LIMITS = {
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4.1": 1047576,
+    "gpt-4.1-mini": 1047576,
+}
+DEFAULT_CONTEXT_LIMIT = 128000
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Model unknown to tiktoken (e.g. a fine-tune): use the current default encoding
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # Encodings are downloaded on first use; offline hosts fall back to estimates
+        print(f"[LLM Batching] Tokenizer for {model} unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text, model="gpt-4o"):
+    """
+    Token count of `text` with the model's tokenizer (tiktoken), or an estimate
+    (~4 characters per token) when the tokenizer isn't available.
+    """
+    encoding = _encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class Batch(list):
+    """
+    Items of one LLM call, with the planned prompt and completion token counts.
+    """
+
+    def __init__(self, items=(), input_tokens=0, output_tokens=0):
+        super().__init__(items)
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+
+def plan_batches(items, serialize, output_tokens_per_item, prompt_tokens=0, model="gpt-4o",
+                 input_budget=LLM_INPUT_TOKEN_BUDGET, output_budget=LLM_OUTPUT_TOKEN_BUDGET, max_items=None):
+    """
+    Packs `items` in order into batches whose serialized size stays within
+    `input_budget` tokens and whose expected reply stays within `output_budget`
+    tokens; a batch is also closed before prompt + input + output would exceed the
+    model's context window. An item too large for any budget gets a batch of its own.
+
+    `serialize(item)` returns the text the item contributes to the prompt (e.g. its
+    JSON), measured with the model's tokenizer.
+    """
+    context_limit = MODEL_CONTEXT_LIMITS.get(model, DEFAULT_CONTEXT_LIMIT)
+    batches = []
+    current = Batch()
+    for item in items:
+        # +1 for the separator between items of the JSON list
+        tokens = count_tokens(serialize(item), model) + 1
+        fits = (
+            current.input_tokens + tokens <= input_budget
+            and current.output_tokens + output_tokens_per_item <= output_budget
+            and prompt_tokens + current.input_tokens + tokens + current.output_tokens + output_tokens_per_item <= context_limit
+            and (max_items is None or len(current) < max_items)
+        )
+        if current and not fits:
+            batches.append(current)
+            current = Batch()
+        if prompt_tokens + tokens + output_tokens_per_item > context_limit:
+            print(f"[LLM Batching] Item of {tokens} tokens exceeds the {model} context window")
+        current.append(item)
+        current.input_tokens += tokens
+        current.output_tokens += output_tokens_per_item
+    if current:
+        batches.append(current)
+    return batches
+
+
+def template_tokens(prompt, model="gpt-4o"):
+    """
+    Tokens of a ChatPromptTemplate's fixed text (its messages without variables).
+    """
+    text = " ".join(getattr(getattr(m, "prompt", None), "template", "") for m in prompt.messages)
+    return count_tokens(text, model)
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+
+# On-disk store of LLM results, shared by all LLM nodes
+LLM_CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", "cache/llm_cache.sqlite"))
+
+# Entries older than this are treated as misses and purged (0 = never expire)
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+
+# Total stored value size; least recently used entries are evicted beyond this
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 64 * 2**20))
+
+# Set to 0 to bypass the cache entirely
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+
+# On-disk store of embedding vectors, shared by the report pipeline and the chat tools
+EMBEDDING_CACHE_PATH = Path(os.getenv("EMBEDDING_CACHE_PATH", "cache/embedding_cache.sqlite"))
+
+# Total stored vector size; least recently used vectors are evicted beyond this
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 256 * 2**20))
+
+# Vectors kept in the in-process LRU tier in front of the disk store
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", 10000))
+
+# Set to 0 to bypass the embedding cache entirely
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "1") != "0"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    version TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (accessed_at);
+CREATE INDEX IF NOT EXISTS entries_namespace ON entries (namespace, version);
+"""
+
+
+def stable_hash(*parts):
+    """
+    SHA-256 over canonical JSON (sorted keys, no whitespace) of `parts`.
+    """
+    data = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def prompt_version(prompt, model_name):
+    """
+    Version string derived from the prompt template's messages and the model, so
+    editing the prompt or switching models invalidates cached results.
+    """
+    messages = [(type(m).__name__, getattr(getattr(m, "prompt", None), "template", str(m))) for m in prompt.messages]
+    return stable_hash(model_name, messages)[:16]
+
+
+class LLMCache:
+    """
+    Content-addressed SQLite cache of JSON results for one namespace (e.g. one LLM
+    node). Keys hash the namespace, version and normalized input, so equal inputs
+    hit across runs. On open, entries of the namespace written under another
+    version (prompt or model changed) are dropped.
+
+    Reads and writes are batched: one query per `get_many` and one transaction per
+    `put_many`, with LRU eviction by total value size after each write.
+    """
+
+    def __init__(self, namespace, version, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL_SECONDS, max_bytes=LLM_CACHE_MAX_BYTES):
+        self.namespace = namespace
+        self.version = version
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared by the pipeline's worker threads; the lock keeps their transactions apart
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        with self.conn:
+            self.conn.execute("DELETE FROM entries WHERE namespace = ? AND version != ?", (namespace, version))
+            if ttl:
+                self.conn.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - ttl,))
+
+    def key(self, payload):
+        return stable_hash(self.namespace, self.version, payload)
+
+    def get_many(self, keys):
+        """
+        Returns {key: value} for the keys present and fresh; counts hits and misses.
+        """
+        unique = list(dict.fromkeys(keys))
+        found = {}
+        cutoff = time.time() - self.ttl if self.ttl else 0
+        with self._lock:
+            # SQLite limits bound parameters per statement
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({','.join('?' * len(part))}) AND created_at >= ?",
+                    (*part, cutoff),
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+            if found:
+                now = time.time()
+                with self.conn:
+                    self.conn.executemany("UPDATE entries SET accessed_at = ? WHERE key = ?", [(now, k) for k in found])
+            hits = sum(1 for k in keys if k in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, items):
+        """
+        Stores {key: value} (JSON-serializable values) and evicts LRU entries over `max_bytes`.
+        """
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            data = json.dumps(value, ensure_ascii=False)
+            rows.append((key, self.namespace, self.version, data, len(data), now, now))
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._evict()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self.conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+_EMBEDDING_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vectors (
+    key TEXT PRIMARY KEY,
+    vector BLOB NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS vectors_lru ON vectors (accessed_at);
+"""
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of embedding vectors keyed by `key(model, dimensions, text)`:
+    an in-process LRU of `memory_items` vectors in front of a SQLite store of
+    float32 blobs, evicted least recently used beyond `max_bytes`. Disk hits are
+    promoted to memory. Embeddings don't depend on prompts, so entries never expire.
+
+    `memory_hits`, `disk_hits` and `misses` count lookups; `hit_ratio` covers both tiers.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_bytes=EMBEDDING_CACHE_MAX_BYTES,
+                 memory_items=EMBEDDING_CACHE_MEMORY_ITEMS):
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.memory = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Shared by the pipeline's worker threads and the chat API's request threads
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_EMBEDDING_SCHEMA)
+
+    @staticmethod
+    def key(model, dimensions, text):
+        return stable_hash("embedding", model, dimensions, text)
+
+    def _remember(self, key, vector):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def get_many(self, keys):
+        """
+        Returns {key: vector} for the keys cached in memory or on disk.
+        """
+        found = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                vector = self.memory.get(key)
+                if vector is not None:
+                    self.memory.move_to_end(key)
+                    found[key] = vector
+            on_disk = [key for key in dict.fromkeys(keys) if key not in found]
+            from_disk = {}
+            for start in range(0, len(on_disk), 500):
+                part = on_disk[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM vectors WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                from_disk.update((key, np.frombuffer(blob, dtype=np.float32).tolist()) for key, blob in rows)
+            if from_disk:
+                now = time.time()
+                with self.conn:
+                    self.conn.executemany("UPDATE vectors SET accessed_at = ? WHERE key = ?", [(now, k) for k in from_disk])
+                for key, vector in from_disk.items():
+                    self._remember(key, vector)
+            found.update(from_disk)
+            memory_hits = sum(1 for k in keys if k in found and k not in from_disk)
+            disk_hits = sum(1 for k in keys if k in from_disk)
+            self.memory_hits += memory_hits
+            self.disk_hits += disk_hits
+            self.misses += len(keys) - memory_hits - disk_hits
+        return found
+
+    def put_many(self, items):
+        """
+        Stores {key: vector} in both tiers and evicts LRU vectors over `max_bytes` on disk.
+        """
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+            with self.conn:
+                self.conn.executemany("INSERT OR REPLACE INTO vectors VALUES (?, ?, ?)", rows)
+                self._evict()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM vectors").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in self.conn.execute("SELECT key, LENGTH(vector) FROM vectors ORDER BY accessed_at"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self.conn.executemany("DELETE FROM vectors WHERE key = ?", victims)
+
+    @property
+    def hit_ratio(self):
+        total = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / total if total else 0.0
@@ -0,0 +1,139 @@
+"""
+Compact tabular encoding of record batches for LLM prompts.
+
+A batch of dicts becomes a header row plus one "|"-delimited line per record, so
+key names appear once per batch instead of once per record. Strings that repeat
+within the batch (users, IPs, endpoints, event names) are dictionary-coded as $n.
+
+    dict: $0=/login $1=FAILED_LOGIN $2=136.124.145.86
+    ref|timestamp|user|ip|endpoint|event
+    0|2025-06-30 04:32:08|ramoskathleen|$2|$0|$1
+    1|2025-06-30 04:32:19|ramoskathleen|$2|$0|$1
+
+Empty cells are missing fields. Cells that contain the delimiter, a newline, or
+start with $ or a quote are written as JSON strings.
+"""
+import json
+import re
+from collections import Counter
+
+DELIMITER = "|"
+
+# Strings shorter than this cost about as many tokens as their $n code
+MIN_DICT_LENGTH = 5
+
+TABLE_FORMAT_HINT = (
+    "Records are given as a table: an optional `dict:` line defining $n codes for repeated "
+    "values, a header row of field names, then one row per record with values separated by "
+    "`|`. Replace $n with its dictionary value; an empty cell means the field is absent."
+)
+
+_CODE = re.compile(r"^\$(\d+)$")
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    if not isinstance(value, str):
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    if not value or DELIMITER in value or "\n" in value or value[0] in '$"':
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def encode_row(record, columns=None):
+    """
+    One record as a delimited row without dictionary coding; an upper bound on its
+    encoded size, used for token budgeting before the batch is known.
+    """
+    columns = columns or list(record)
+    return DELIMITER.join(_cell(record.get(column)) for column in columns)
+
+
+def encode_table(records, columns=None, index_column="ref"):
+    """
+    Encodes a list of dicts as a compact table. With `index_column`, each row starts
+    with its position in `records`, which the model echoes back to key its replies.
+    """
+    if columns is None:
+        columns = list(dict.fromkeys(key for record in records for key in record))
+    counts = Counter(
+        value for record in records for value in record.values()
+        if isinstance(value, str) and len(value) >= MIN_DICT_LENGTH
+    )
+    codes = {value: f"${n}" for n, value in enumerate(v for v, c in counts.most_common() if c > 1)}
+
+    lines = []
+    if codes:
+        # Entries are space-separated, so values with whitespace are quoted
+        lines.append("dict: " + " ".join(
+            f"{code}={json.dumps(value, ensure_ascii=False) if any(c.isspace() for c in value) else _cell(value)}"
+            for value, code in codes.items()
+        ))
+    header = ([index_column] if index_column else []) + columns
+    lines.append(DELIMITER.join(header))
+    for n, record in enumerate(records):
+        cells = [str(n)] if index_column else []
+        for column in columns:
+            value = record.get(column)
+            cells.append(codes.get(value) if isinstance(value, str) and value in codes else _cell(value))
+        lines.append(DELIMITER.join(cells))
+    return "\n".join(lines)
+
+
+def _split_cells(line):
+    # Split on the delimiter outside JSON-quoted cells
+    cells, current, quoted, escaped = [], [], False, False
+    for char in line:
+        if quoted:
+            current.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                quoted = False
+        elif char == '"' and not current:
+            quoted = True
+            current.append(char)
+        elif char == DELIMITER:
+            cells.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    cells.append("".join(current))
+    return cells
+
+
+def _decode_cell(cell, dictionary):
+    if cell == "":
+        return None
+    if cell[0] == '"':
+        return json.loads(cell)
+    match = _CODE.match(cell)
+    if match:
+        return dictionary[match.group(0)]
+    return cell
+
+
+def decode_table(text):
+    """
+    Inverse of `encode_table` (values come back as strings): returns a list of dicts.
+    """
+    lines = text.split("\n")
+    dictionary = {}
+    if lines and lines[0].startswith("dict: "):
+        for entry in re.finditer(r'(\$\d+)=("(?:[^"\\]|\\.)*"|\S+)', lines[0][6:]):
+            code, value = entry.groups()
+            dictionary[code] = json.loads(value) if value.startswith('"') else value
+        lines = lines[1:]
+    header = _split_cells(lines[0])
+    records = []
+    for line in lines[1:]:
+        values = [_decode_cell(cell, dictionary) for cell in _split_cells(line)]
+        records.append({k: v for k, v in zip(header, values) if v is not None})
+    return records
@@ -0,0 +1,299 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+# Provider limits shared by all concurrent LLM calls of this process
+LLM_RPM = int(os.getenv("LLM_RPM", 500))
+LLM_TPM = int(os.getenv("LLM_TPM", 30000))
+
+# Max LLM requests in flight at once (1 = the original serial, blocking calls)
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", 8))
+
+# Retries per request on 429 / 5xx / connection errors
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 5))
+
+# Backoff bounds in seconds; each retry sleeps a random time up to min(cap, base * 2^attempt)
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 1.0))
+LLM_BACKOFF_CAP = float(os.getenv("LLM_BACKOFF_CAP", 30.0))
+
+# Seconds before a single LLM call is abandoned (and retried); 0 = no timeout
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", 120.0))
+
+# Min seconds between two concurrency cuts, so a burst of 429s from calls that
+# were already in flight halves the limit once rather than once per call
+LLM_ADAPTIVE_COOLDOWN = float(os.getenv("LLM_ADAPTIVE_COOLDOWN", 2.0))
+
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+class TokenBucket:
+    """
+    Refills `per_minute` units per minute up to a one-minute burst.
+    """
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """
+        Seconds until `amount` units are available (requests larger than the
+        burst only wait for a full bucket).
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+
+class AsyncRateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limits for concurrent LLM calls.
+    Waiters of one event loop are served in arrival order; bucket state is shared
+    by every thread and persists across runs.
+    """
+
+    def __init__(self, rpm=LLM_RPM, tpm=LLM_TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.resume_at = 0.0
+        self._mutex = threading.Lock()
+        self._locks = weakref.WeakKeyDictionary()
+
+    def _get_lock(self):
+        # asyncio.Lock binds to one event loop; pipeline stages run one loop per thread
+        loop = asyncio.get_running_loop()
+        with self._mutex:
+            lock = self._locks.get(loop)
+            if lock is None:
+                lock = self._locks[loop] = asyncio.Lock()
+        return lock
+
+    async def acquire(self, tokens=0):
+        async with self._get_lock():
+            while True:
+                # The buckets are shared by the loops of every thread
+                with self._mutex:
+                    wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens),
+                               self.resume_at - time.monotonic())
+                    if wait <= 0:
+                        self.requests.consume(1)
+                        self.tokens.consume(tokens)
+                        return
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Holds back every caller for `seconds` (a server's Retry-After applies to
+        the whole account, not just the request that got it).
+        """
+        self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit that adapts to the provider (AIMD): halved on a rate-limit
+    response, grown by one after about `limit` consecutive successes, between
+    `minimum` and `maximum`. Used as `async with concurrency:` around each call.
+    """
+
+    def __init__(self, maximum=LLM_MAX_IN_FLIGHT, minimum=1, cooldown=LLM_ADAPTIVE_COOLDOWN):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.cooldown = cooldown
+        self.limit = float(self.maximum)
+        self.in_flight = 0
+        self.cuts = 0
+        self._cut_at = 0.0
+        self._mutex = threading.Lock()
+        self._conditions = weakref.WeakKeyDictionary()
+
+    def _get_condition(self):
+        # asyncio.Condition binds to one event loop; pipeline stages run one loop per thread
+        loop = asyncio.get_running_loop()
+        with self._mutex:
+            condition = self._conditions.get(loop)
+            if condition is None:
+                condition = self._conditions[loop] = asyncio.Condition()
+        return condition
+
+    def _try_enter(self):
+        with self._mutex:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    async def __aenter__(self):
+        condition = self._get_condition()
+        async with condition:
+            while not self._try_enter():
+                # Slots freed by another thread's loop don't notify this one; poll briefly
+                try:
+                    await asyncio.wait_for(condition.wait(), 0.05)
+                except asyncio.TimeoutError:
+                    pass
+        return self
+
+    async def __aexit__(self, *exc_info):
+        with self._mutex:
+            self.in_flight -= 1
+        condition = self._get_condition()
+        async with condition:
+            condition.notify_all()
+
+    def on_success(self):
+        with self._mutex:
+            self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+
+    def on_rate_limit(self):
+        now = time.monotonic()
+        with self._mutex:
+            if now - self._cut_at >= self.cooldown:
+                self._cut_at = now
+                self.limit = max(float(self.minimum), self.limit / 2)
+                self.cuts += 1
+
+
+_limiters = {}
+
+
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name="default", rpm=LLM_RPM, tpm=LLM_TPM):
+    """
+    Process-wide limiter per provider/model, so every node shares one budget.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = _limiters[name] = AsyncRateLimiter(rpm, tpm)
+    return limiter
+
+
+def estimate_tokens(text):
+    # Rough count for rate limiting (~4 characters per token)
+    return len(text) // 4 + 1
+
+
+def _status_code(exc):
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def is_retryable(exc):
+    """
+    True for rate limits (429), timeouts, server errors (5xx) and connection failures.
+    """
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS or status >= 500
+    # openai.APIConnectionError / APITimeoutError carry no status code
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def is_rate_limit(exc):
+    return _status_code(exc) == 429 or type(exc).__name__ == "RateLimitError"
+
+
+def retry_after(exc):
+    """
+    Seconds requested by a Retry-After header on the error's response, if any.
+    """
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=LLM_BACKOFF_BASE, cap=LLM_BACKOFF_CAP):
+    # Full jitter: concurrent callers that failed together don't retry together
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def _attempt(call, timeout):
+    if timeout:
+        return await asyncio.wait_for(call(), timeout)
+    return await call()
+
+
+async def call_with_retries(call, tokens=0, limiter=None, max_retries=LLM_MAX_RETRIES,
+                            concurrency=None, timeout=LLM_CALL_TIMEOUT):
+    """
+    Awaits `call()` (a coroutine factory) under the rate limiter, retrying retryable
+    errors with jittered exponential backoff (or the server's Retry-After, which
+    also pauses the limiter for every caller). Each attempt is abandoned after
+    `timeout` seconds. With an AdaptiveConcurrency, each attempt holds one of its
+    slots and reports rate limits / successes to it.
+    Non-retryable errors and the last failure are raised.
+    """
+    limiter = limiter or get_rate_limiter()
+    for attempt in range(max_retries + 1):
+        try:
+            if concurrency is None:
+                await limiter.acquire(tokens)
+                return await _attempt(call, timeout)
+            async with concurrency:
+                await limiter.acquire(tokens)
+                result = await _attempt(call, timeout)
+            concurrency.on_success()
+            return result
+        except Exception as e:
+            if concurrency is not None and is_rate_limit(e):
+                concurrency.on_rate_limit()
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            server_delay = retry_after(e)
+            if server_delay:
+                limiter.pause(server_delay)
+            delay = max(backoff_delay(attempt), server_delay or 0)
+            print(f"[LLM] {type(e).__name__} (status {_status_code(e)}), retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def gather_limited(items, worker, max_in_flight=LLM_MAX_IN_FLIGHT):
+    """
+    Runs `worker(item)` for every item with at most `max_in_flight` running at once.
+    Results are returned in input order.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_in_flight))
+
+    async def run(item):
+        async with semaphore:
+            return await worker(item)
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+
+def run_async(coro):
+    """
+    Runs a coroutine to completion from synchronous code (graph nodes), also when
+    the caller is already inside an event loop.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
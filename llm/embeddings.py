@@ -0,0 +1,162 @@
+"""
+Batched, concurrent embedding requests.
+
+`embed_texts(texts)` packs the texts into requests by token budget (the API takes
+a list of inputs per request) and sends up to EMBEDDING_MAX_IN_FLIGHT requests at
+once under the embedding model's own RPM/TPM limiter. A request is retried on
+429s, 5xx and timeouts (llm.concurrency). A request rejected outright (e.g. one
+input over the model's limit) is split in half down to single texts, so only the
+offending text goes without a vector. Vectors come back in input order.
+
+Texts are looked up first in the shared embedding cache (llm.cache.EmbeddingCache,
+keyed by model, dimensions and whitespace-normalized text); only misses are
+requested, each distinct text once, and the new vectors are cached.
+"""
+import os
+import threading
+import time
+from llm.backends import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL, LLM_BACKEND, get_embeddings
+from llm.batching import count_tokens, plan_batches
+from llm.cache import EMBEDDING_CACHE_ENABLED, EmbeddingCache
+from llm.concurrency import LLM_CALL_TIMEOUT, call_with_retries, gather_limited, get_rate_limiter, is_retryable, run_async
+
+# Max input tokens per embedding request
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", 20000))
+
+# Max inputs per embedding request (API limit: 2048)
+EMBEDDING_BATCH_MAX_ITEMS = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS", 2048))
+
+# Embedding requests in flight at once
+EMBEDDING_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", 4))
+
+# Rate limits of the embedding model, separate from the chat models' budget
+EMBEDDING_RPM = int(os.getenv("EMBEDDING_RPM", 3000))
+EMBEDDING_TPM = int(os.getenv("EMBEDDING_TPM", 1000000))
+
+# OpenAI or the local stand-in, per LLM_BACKEND
+embeddings = get_embeddings()
+_clients = {EMBEDDING_MODEL: embeddings}
+_clients_lock = threading.Lock()
+_cache = None
+
+
+class EmbeddingStats:
+    """
+    Embedding counters, cumulative for the process.
+    """
+
+    __slots__ = ("texts", "requests", "failed")
+
+    def __init__(self):
+        self.texts = 0      # texts passed to embed_texts
+        self.requests = 0   # embedding requests sent, including halves of split batches
+        self.failed = 0     # texts left without a vector
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return ", ".join(f"{name}={value}" for name, value in self.as_dict().items())
+
+
+stats = EmbeddingStats()
+
+
+def embedding_client(model=EMBEDDING_MODEL):
+    with _clients_lock:
+        client = _clients.get(model)
+        if client is None:
+            client = _clients[model] = get_embeddings(model)
+    return client
+
+
+def get_embedding_cache():
+    """
+    Process-wide embedding cache, or None when EMBEDDING_CACHE_ENABLED is off.
+    """
+    global _cache
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    with _clients_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+    return _cache
+
+
+def normalize_text(text):
+    # Collapses whitespace (newlines included), so equal texts share one cache entry
+    return " ".join(text.split()) or " "
+
+
+def cache_model_name(model):
+    # Local stand-in vectors never mix with the real model's
+    return f"local:{model}" if LLM_BACKEND == "local" else model
+
+
+async def _embed_batch(batch, client, model, limiter):
+    # Planned batches carry their token count; halves of a split batch are recounted
+    tokens = getattr(batch, "input_tokens", None) or sum(count_tokens(text, model) for text in batch)
+    stats.requests += 1
+    try:
+        vectors = await call_with_retries(
+            lambda: client.aembed_documents(list(batch)), tokens=tokens,
+            limiter=limiter, timeout=LLM_CALL_TIMEOUT
+        )
+        if len(vectors) != len(batch):
+            raise ValueError(f"{len(vectors)} vectors for {len(batch)} inputs")
+        return [vector or None for vector in vectors]
+    except Exception as e:
+        if len(batch) == 1 or is_retryable(e):
+            # Retries are exhausted (outage) or a single input was rejected
+            print(f"[Embeddings] Error for batch of {len(batch)} texts: {str(e) or type(e).__name__}")
+            return [None] * len(batch)
+        middle = len(batch) // 2
+        return (await _embed_batch(batch[:middle], client, model, limiter)
+                + await _embed_batch(batch[middle:], client, model, limiter))
+
+
+def embed_texts(texts, model=EMBEDDING_MODEL, max_in_flight=EMBEDDING_MAX_IN_FLIGHT):
+    """
+    Embeds `texts` with `model`, from the cache where possible and otherwise in
+    token-budgeted requests, several at once; returns one vector per text, in
+    order, or None for a text that could not be embedded (never an empty list,
+    which would silently drop out of vector search).
+    """
+    texts = [normalize_text(text) for text in texts]
+    if not texts:
+        return []
+    cache = get_embedding_cache()
+    name = cache_model_name(model)
+    keys = [EmbeddingCache.key(name, EMBEDDING_DIMENSIONS, text) for text in texts]
+    found = cache.get_many(keys) if cache is not None else {}
+    # Each distinct missing text is requested once
+    pending = {}
+    for key, text in zip(keys, texts):
+        if key not in found:
+            pending.setdefault(key, text)
+    cached = sum(1 for key in keys if key not in pending)
+
+    started = time.perf_counter()
+    batches = []
+    if pending:
+        batches = plan_batches(
+            list(pending.values()), lambda text: text, 0, model=model,
+            input_budget=EMBEDDING_BATCH_TOKENS, max_items=EMBEDDING_BATCH_MAX_ITEMS
+        )
+        client = embedding_client(model)
+        limiter = get_rate_limiter(model, EMBEDDING_RPM, EMBEDDING_TPM)
+        results = run_async(gather_limited(batches, lambda batch: _embed_batch(batch, client, model, limiter), max_in_flight))
+        vectors = [vector for batch in results for vector in batch]
+        new = {key: vector for key, vector in zip(pending, vectors) if vector is not None}
+        if cache is not None:
+            cache.put_many(new)
+        found.update(new)
+
+    vectors = [found.get(key) for key in keys]
+    failed = sum(1 for vector in vectors if vector is None)
+    stats.texts += len(texts)
+    stats.failed += failed
+    ratio = f" (hit ratio {cache.hit_ratio:.0%} this process)" if cache is not None else ""
+    print(f"[Embeddings] {len(texts)} texts: {cached} cached{ratio}, {len(pending)} embedded in {len(batches)} requests in "
+          f"{time.perf_counter() - started:.1f}s" + (f", {failed} failed" if failed else ""))
+    return vectors
@@ -0,0 +1,137 @@
+import json
+from llm.concurrency import is_retryable
+
+
+class RecoveryStats:
+    """
+    Counters for one LLM node's batch recovery, cumulative for the process.
+    """
+
+    __slots__ = ("calls", "partial", "retries", "bisections", "fallbacks")
+
+    def __init__(self):
+        self.calls = 0        # LLM calls made, including retries
+        self.partial = 0      # replies where only some entries were valid
+        self.retries = 0      # re-sends of records whose entries were missing or invalid
+        self.bisections = 0   # failed batches split in half
+        self.fallbacks = 0    # records classified deterministically after failing alone
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def merge(self, other):
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def __repr__(self):
+        return ", ".join(f"{name}={value}" for name, value in self.as_dict().items())
+
+
+def strip_code_fence(content):
+    content = content.strip()
+    if content.startswith("```json"):
+        content = content[7:].strip()
+    elif content.startswith("```"):
+        content = content[3:].strip()
+    if content.endswith("```"):
+        content = content[:-3].strip()
+    return content
+
+
+def parse_json_entries(content, list_key="incidents"):
+    """
+    Extracts the list of JSON objects from an LLM reply: a bare list, an object
+    wrapping it under `list_key` (JSON mode), or a single object. When the reply
+    is cut off mid-list, every complete object before the cut is still returned.
+    """
+    content = strip_code_fence(content)
+    try:
+        data = json.loads(content)
+    except ValueError:
+        data = None
+    if data is not None:
+        if isinstance(data, dict):
+            data = data.get(list_key, [data])
+        return [item for item in data if isinstance(item, dict)] if isinstance(data, list) else []
+
+    # Truncated or malformed: decode objects one by one after the opening bracket
+    start = content.find("[")
+    if start < 0:
+        return []
+    decoder = json.JSONDecoder()
+    entries = []
+    pos = start + 1
+    while True:
+        while pos < len(content) and content[pos] in " \t\r\n,":
+            pos += 1
+        try:
+            item, pos = decoder.raw_decode(content, pos)
+        except ValueError:
+            break
+        if isinstance(item, dict):
+            entries.append(item)
+    return entries
+
+
+def align_entries(entries, count, validate, ref_key="ref"):
+    """
+    Maps reply entries onto `count` inputs by their echoed `ref_key` (falling back
+    to position when the model dropped the refs) and validates each one.
+    Returns a list of `count` validated entries, None where missing or invalid.
+    """
+    aligned = [None] * count
+    refs = [entry.get(ref_key) for entry in entries]
+    by_ref = all(isinstance(ref, int) for ref in refs) and len(set(refs)) == len(refs)
+    for position, entry in enumerate(entries):
+        index = entry.pop(ref_key, None) if by_ref else position
+        entry.pop(ref_key, None)
+        if isinstance(index, int) and 0 <= index < count and aligned[index] is None:
+            aligned[index] = validate(entry)
+    return aligned
+
+
+async def resolve_with_bisection(items, classify, fallback, stats):
+    """
+    Classifies `items` with `classify(items)` (one LLM call returning a list aligned
+    with `items`, None for each entry it couldn't produce) and recovers failures:
+    valid entries of a partial reply are kept and only the rest is re-sent; a batch
+    that fails outright is split in half and each half retried, down to single
+    records. A record that still fails alone gets `fallback(item)`.
+
+    `classify` raises a retryable error (llm.concurrency.is_retryable) once its
+    retries ran out (outage, persistent 429); splitting would only repeat them,
+    so the whole batch gets `fallback` at once.
+
+    Returns a list aligned with `items`; never None entries.
+    """
+    stats.calls += 1
+    try:
+        results = list(await classify(items))
+    except Exception as e:
+        if not is_retryable(e):
+            raise
+        print(f"[LLM Recovery] {type(e).__name__} after retries, falling back for {len(items)} records")
+        stats.fallbacks += len(items)
+        return [fallback(item) for item in items]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if not missing:
+        return results
+
+    if len(items) == 1:
+        stats.fallbacks += 1
+        return [fallback(items[0])]
+
+    stats.retries += 1
+    if len(missing) < len(items):
+        # Partial reply: keep what parsed, retry only the rest
+        stats.partial += 1
+        retried = await resolve_with_bisection([items[i] for i in missing], classify, fallback, stats)
+        for i, result in zip(missing, retried):
+            results[i] = result
+        return results
+
+    stats.bisections += 1
+    middle = len(items) // 2
+    left = await resolve_with_bisection(items[:middle], classify, fallback, stats)
+    right = await resolve_with_bisection(items[middle:], classify, fallback, stats)
+    return left + right
@@ -1,41 +1,117 @@
-import json
-import os
-from pathlib import Path
+import argparse
+import copy
 from graph.flow import build_graph
+from graph.checkpoints import resume_run, run_flow
+from graph.partitioned import PARTITION_WORKERS
+from graph.pipeline import PIPELINE_BATCH_SIZE, run_pipelined
 from state_schema import State
-from csvtojson import csv_to_json  # This function should return a list of dicts
+from ingestion.stream import DATA_DIR, CHUNK_SIZE, INGEST_WORKERS, iter_log_chunks, iter_log_files
+from ingestion.manifest import load_manifest, save_manifest, find_changed_files
+from ingestion.follow import FOLLOW_BATCH_SIZE, FOLLOW_FLUSH_SECONDS, follow_logs
+from ml.behavior import DetectionWindows
 
-DATA_DIR = Path("data")
 
-def load_logs():
+def load_logs(paths=None, workers=INGEST_WORKERS):
     all_logs = []
 
-    for file_path in DATA_DIR.rglob("*"):  # includes subfolders
-        if file_path.is_file():
-            try:
-                if file_path.suffix == ".json":
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        logs = json.load(f)
-                        if isinstance(logs, dict):
-                            logs = [logs]
-                        all_logs.extend(logs)
-                elif file_path.suffix == ".csv":
-                    logs = csv_to_json(str(file_path))
-                    all_logs.extend(logs)
-            except Exception as e:
-                print(f"Error loading {file_path}: {e}")
+    for chunk in iter_log_chunks(DATA_DIR, paths=paths, workers=workers):
+        all_logs.extend(chunk)
 
     return all_logs
 
-def get_initial_state():
-    logs = load_logs()
+def get_initial_state(stream=False, chunk_size=CHUNK_SIZE, paths=None, workers=INGEST_WORKERS, columnar=False):
+    if stream or columnar:
+        # Logs are read lazily by the detector in bounded chunks
+        source = {"data_dir": str(DATA_DIR), "chunk_size": chunk_size, "workers": workers, "columnar": columnar}
+        if paths is not None:
+            source["paths"] = [str(p) for p in paths]
+        return State(logs=[], log_source=source, accessed_by="l3_analyst@bank.co.in", user_role="L3")
+
+    logs = load_logs(paths=paths, workers=workers)
     return State(logs=logs, accessed_by="l3_analyst@bank.co.in", user_role="L3")
 
-def main():
-    flow = build_graph()
-    initial_state = get_initial_state()
-    final_state = flow.invoke(initial_state)
+def main(stream=False, chunk_size=CHUNK_SIZE, workers=INGEST_WORKERS, incremental=False, columnar=False,
+         pipelined=False, pipeline_batch_size=PIPELINE_BATCH_SIZE, partitioned=False, run_id=None, resume=None):
+    if resume:
+        # Continues from the failed node; ingestion and completed nodes are not rerun
+        return resume_run(resume, config={"max_concurrency": PARTITION_WORKERS})
+
+    paths = None
+    fingerprints = None
+
+    if incremental:
+        # Only ingest files that are new or changed since the last successful run
+        manifest = load_manifest()
+        paths, fingerprints = find_changed_files(list(iter_log_files(DATA_DIR)), manifest)
+        skipped = len(fingerprints) - len(paths)
+        print(f"[Ingestion] {len(paths)} new/changed files, {skipped} unchanged skipped")
+        if not paths:
+            return None
+
+    initial_state = get_initial_state(stream=stream, chunk_size=chunk_size, paths=paths, workers=workers, columnar=columnar)
+    if pipelined:
+        # LLM, recommendation and embedding stages overlap on micro-batches
+        final_state = run_pipelined(initial_state, batch_size=pipeline_batch_size)
+    elif partitioned:
+        # Partitions fan out with Send; max_concurrency caps those running at once
+        final_state = run_flow("partitioned", initial_state, run_id=run_id, config={"max_concurrency": PARTITION_WORKERS})
+    else:
+        final_state = run_flow("graph", initial_state, run_id=run_id)
+
+    if incremental:
+        # Files are marked processed only after the whole run succeeded
+        manifest.update(fingerprints)
+        save_manifest(manifest)
+
     return final_state
 
+def follow(watch_dir=DATA_DIR, batch_size=FOLLOW_BATCH_SIZE, flush_interval=FOLLOW_FLUSH_SECONDS):
+    """
+    Daemon mode: runs the graph on micro-batches of newly appended records
+    instead of reloading the whole data directory.
+
+    Rule burst counts and behavioral windows carry across micro-batches. Each batch
+    runs on a copy of them, kept only if the batch succeeds, so a retried or
+    dead-lettered batch is never counted twice.
+    """
+    flow = build_graph()
+    windows = DetectionWindows()
+
+    def run_batch(logs):
+        nonlocal windows
+        attempt = copy.deepcopy(windows)
+        flow.invoke(State(logs=logs, windows=attempt, accessed_by="l3_analyst@bank.co.in", user_role="L3"))
+        windows = attempt
+
+    follow_logs(run_batch, watch_dir=watch_dir, batch_size=batch_size, flush_interval=flush_interval)
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run the SOC incident detection pipeline.")
+    parser.add_argument("--stream", action="store_true", help="Stream logs in bounded chunks instead of loading them all into memory")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Records per chunk in streaming mode")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Processes used to parse log files concurrently")
+    parser.add_argument("--columnar", action="store_true", help="Score from the Arrow columnar cache (built once per source file)")
+    parser.add_argument("--incremental", action="store_true", help="Skip files unchanged since the last successful run")
+    parser.add_argument("--follow", action="store_true", help="Keep running and process newly appended records in micro-batches")
+    parser.add_argument("--watch-dir", default=str(DATA_DIR), help="Directory watched in follow mode (e.g. a spool directory)")
+    parser.add_argument("--batch-size", type=int, default=FOLLOW_BATCH_SIZE, help="Max records per micro-batch in follow mode")
+    parser.add_argument("--flush-interval", type=float, default=FOLLOW_FLUSH_SECONDS, help="Max seconds to buffer records in follow mode")
+    parser.add_argument("--pipelined", action="store_true", help="Overlap the LLM, recommendation and embedding stages on micro-batches")
+    parser.add_argument("--pipeline-batch-size", type=int, default=PIPELINE_BATCH_SIZE, help="Log groups per micro-batch in pipelined mode")
+    parser.add_argument("--partitioned", action="store_true", help="Fan detection, classification and response out over log partitions (PARTITION_BY)")
+    parser.add_argument("--run-id", help="ID the run's per-node checkpoints are stored under; checkpoints in-memory runs too (default: generated for streaming runs)")
+    parser.add_argument("--resume", metavar="RUN_ID", help="Continue a failed run from its last completed node")
+    args = parser.parse_args()
+    if args.partitioned and (args.stream or args.columnar or args.pipelined):
+        parser.error("--partitioned works on loaded logs; it can't be combined with --stream, --columnar or --pipelined")
+    if (args.run_id or args.resume) and (args.pipelined or args.follow):
+        parser.error("--run-id and --resume apply to the graph flows; they can't be combined with --pipelined or --follow")
+    if args.resume and args.incremental:
+        parser.error("--resume can't be combined with --incremental; the resumed run keeps its own inputs")
+
+    if args.follow:
+        follow(watch_dir=args.watch_dir, batch_size=args.batch_size, flush_interval=args.flush_interval)
+    else:
+        main(stream=args.stream, chunk_size=args.chunk_size, workers=args.workers, incremental=args.incremental, columnar=args.columnar,
+             pipelined=args.pipelined, pipeline_batch_size=args.pipeline_batch_size, partitioned=args.partitioned,
+             run_id=args.run_id, resume=args.resume)
@@ -0,0 +1,272 @@
+import os
+from collections import OrderedDict, deque
+import numpy as np
+
+# Trailing window for failed-login and distinct-endpoint counts
+BEHAVIOR_WINDOW_SECONDS = int(os.getenv("BEHAVIOR_WINDOW_SECONDS", 300))
+
+# Shorter window for request bursts per IP / endpoint
+BEHAVIOR_BURST_SECONDS = int(os.getenv("BEHAVIOR_BURST_SECONDS", 60))
+
+# Max tracked keys per table; the least recently active keys are evicted beyond this
+BEHAVIOR_MAX_KEYS = int(os.getenv("BEHAVIOR_MAX_KEYS", 100000))
+
+# Max remembered IPs per user for first-seen detection
+BEHAVIOR_MAX_IPS_PER_USER = int(os.getenv("BEHAVIOR_MAX_IPS_PER_USER", 32))
+
+BEHAVIOR_COLUMNS = [
+    "user_failed_logins_5m",
+    "ip_failed_logins_5m",
+    "ip_events_1m",
+    "endpoint_events_1m",
+    "user_distinct_endpoints_5m",
+    "user_new_ip",
+]
+
+FAILED_LOGIN = "FAILED_LOGIN"
+
+
+class SlidingCounter:
+    """
+    Per-key event counts over a trailing time window.
+
+    Each key holds a deque of event timestamps; expired timestamps are popped from the
+    left as new events arrive, so an update is O(1) amortized. Keys are kept in
+    least-recently-active order, which lets idle keys (nothing left in the window) be
+    evicted from the front in O(1) per key and caps the table at `max_keys`.
+    """
+
+    __slots__ = ("window", "max_keys", "_events")
+
+    def __init__(self, window, max_keys=BEHAVIOR_MAX_KEYS):
+        self.window = window
+        self.max_keys = max_keys
+        self._events = OrderedDict()
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, key, ts):
+        """
+        Records one event for `key` at `ts` and returns the key's count in the window.
+        """
+        events = self._events.get(key)
+        if events is None:
+            events = self._events[key] = deque()
+        else:
+            self._events.move_to_end(key)
+        events.append(ts)
+        cutoff = ts - self.window
+        while events[0] <= cutoff:
+            events.popleft()
+        self._evict(cutoff)
+        return len(events)
+
+    def count(self, key, ts):
+        """
+        Returns the key's count in the window ending at `ts` without recording an event.
+        """
+        events = self._events.get(key)
+        if not events:
+            return 0
+        cutoff = ts - self.window
+        while events and events[0] <= cutoff:
+            events.popleft()
+        return len(events)
+
+    def _evict(self, cutoff):
+        while self._events:
+            key, events = next(iter(self._events.items()))
+            if len(self._events) <= self.max_keys and events and events[-1] > cutoff:
+                break
+            del self._events[key]
+
+
+class SlidingDistinct:
+    """
+    Per-key number of distinct values seen in a trailing time window (e.g. endpoints
+    per user), with the same O(1) amortized updates and idle-key eviction as SlidingCounter.
+    """
+
+    __slots__ = ("window", "max_keys", "_entries")
+
+    def __init__(self, window, max_keys=BEHAVIOR_MAX_KEYS):
+        self.window = window
+        self.max_keys = max_keys
+        self._entries = OrderedDict()  # key -> (deque of (ts, value), {value: count})
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key, ts, value):
+        """
+        Records `value` for `key` at `ts` and returns the key's distinct count in the window.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = (deque(), {})
+        else:
+            self._entries.move_to_end(key)
+        events, counts = entry
+        events.append((ts, value))
+        counts[value] = counts.get(value, 0) + 1
+
+        cutoff = ts - self.window
+        self._expire(events, counts, cutoff)
+
+        while self._entries:
+            old_key, (old_events, _) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_keys and old_events and old_events[-1][0] > cutoff:
+                break
+            del self._entries[old_key]
+        return len(counts)
+
+    def count(self, key, ts):
+        """
+        Returns the key's distinct count in the window ending at `ts` without recording a value.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return 0
+        events, counts = entry
+        self._expire(events, counts, ts - self.window)
+        return len(counts)
+
+    @staticmethod
+    def _expire(events, counts, cutoff):
+        while events and events[0][0] <= cutoff:
+            _, old = events.popleft()
+            remaining = counts[old] - 1
+            if remaining:
+                counts[old] = remaining
+            else:
+                del counts[old]
+
+
+class FirstSeen:
+    """
+    Remembers up to `max_values` recent values per key (e.g. IPs per user) and reports
+    whether a value is new for that key. Keys and values are LRU-bounded.
+    """
+
+    __slots__ = ("max_keys", "max_values", "_seen")
+
+    def __init__(self, max_keys=BEHAVIOR_MAX_KEYS, max_values=BEHAVIOR_MAX_IPS_PER_USER):
+        self.max_keys = max_keys
+        self.max_values = max_values
+        self._seen = OrderedDict()
+
+    def __len__(self):
+        return len(self._seen)
+
+    def __contains__(self, key):
+        return key in self._seen
+
+    def add(self, key, value):
+        """
+        Records `value` for `key`; returns True if the key hadn't seen it (recently).
+        """
+        values = self._seen.get(key)
+        if values is None:
+            values = self._seen[key] = OrderedDict()
+            if len(self._seen) > self.max_keys:
+                self._seen.popitem(last=False)
+        else:
+            self._seen.move_to_end(key)
+
+        if value in values:
+            values.move_to_end(value)
+            return False
+        values[value] = None
+        if len(values) > self.max_values:
+            values.popitem(last=False)
+        return True
+
+
+class BehaviorTracker:
+    """
+    Streaming per-user / per-IP / per-endpoint behavioral features (BEHAVIOR_COLUMNS).
+
+    Events must be fed in arrival order; each update is O(1) amortized and all state is
+    bounded by BEHAVIOR_MAX_KEYS, so one tracker can follow a live feed indefinitely.
+    The first event of a user is not counted as a new IP (there is no history yet).
+    """
+
+    def __init__(self, window=BEHAVIOR_WINDOW_SECONDS, burst_window=BEHAVIOR_BURST_SECONDS, max_keys=BEHAVIOR_MAX_KEYS):
+        self.user_failed = SlidingCounter(window, max_keys)
+        self.ip_failed = SlidingCounter(window, max_keys)
+        self.ip_events = SlidingCounter(burst_window, max_keys)
+        self.endpoint_events = SlidingCounter(burst_window, max_keys)
+        self.user_endpoints = SlidingDistinct(window, max_keys)
+        self.user_ips = FirstSeen(max_keys)
+        self.last_ts = 0
+
+    def update(self, ts, user, ip, endpoint, event):
+        """
+        Feeds one event and returns its feature values in BEHAVIOR_COLUMNS order.
+        Events without a timestamp are placed at the latest time seen so far.
+        """
+        if ts is None or ts != ts:  # None or NaN
+            ts = self.last_ts
+        elif ts > self.last_ts:
+            self.last_ts = ts
+
+        failed = event == FAILED_LOGIN
+        if user is not None:
+            user_failed = self.user_failed.add(user, ts) if failed else self.user_failed.count(user, ts)
+            if endpoint is not None:
+                distinct = self.user_endpoints.add(user, ts, endpoint)
+            else:
+                distinct = self.user_endpoints.count(user, ts)
+            new_ip = 0
+            if ip is not None:
+                known_user = user in self.user_ips
+                new_ip = int(self.user_ips.add(user, ip) and known_user)
+        else:
+            user_failed = distinct = new_ip = 0
+
+        if ip is not None:
+            ip_failed = self.ip_failed.add(ip, ts) if failed else self.ip_failed.count(ip, ts)
+            ip_events = self.ip_events.add(ip, ts)
+        else:
+            ip_failed = ip_events = 0
+
+        endpoint_events = self.endpoint_events.add(endpoint, ts) if endpoint is not None else 0
+
+        return user_failed, ip_failed, ip_events, endpoint_events, distinct, new_ip
+
+    def update_many(self, ts, users, ips, endpoints, events):
+        """
+        Feeds a batch of events (parallel sequences) and returns an (n, len(BEHAVIOR_COLUMNS)) array.
+        """
+        update = self.update
+        rows = [update(*event) for event in zip(ts, users, ips, endpoints, events)]
+        if not rows:
+            return np.empty((0, len(BEHAVIOR_COLUMNS)))
+        return np.array(rows, dtype=np.float64)
+
+
+class DetectionWindows:
+    """
+    Sliding-window state of one detection run: the rule engine's burst counters and
+    the BehaviorTracker.
+
+    A run starts from empty windows, so processing the same logs again (a repeated
+    run, --resume) doesn't count them twice. Follow mode passes one instance through
+    `state['windows']` so windows carry across its micro-batches.
+    """
+
+    __slots__ = ("rules", "behavior")
+
+    def __init__(self):
+        self.rules = {}  # (rule id, window seconds) -> SlidingCounter
+        self.behavior = BehaviorTracker()
+
+    def rule_counter(self, rule_id, window):
+        """
+        Returns the burst counter of a rule, created empty on first use.
+        """
+        counter = self.rules.get((rule_id, window))
+        if counter is None:
+            counter = self.rules[(rule_id, window)] = SlidingCounter(window)
+        return counter
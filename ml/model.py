@@ -1,46 +1,185 @@
+import numpy as np
 import pandas as pd
-from datetime import datetime
 import os
-import pickle
-
-# Load trained model and encoders from ml_cache only once
-MODEL_PATH = "ml/ml_cache/iforest_model.pkl"
-EVENT_ENCODER_PATH = "ml/ml_cache/event_encoder.pkl"
+from ml.behavior import BEHAVIOR_COLUMNS, BehaviorTracker
+from ml.registry import get_registry
 
+# Active model and encoders, refreshed from the registry on each load call
 model = None
 event_encoder = None
+model_version = None
 
 
 def load_model_and_encoders():
-    global model, event_encoder
-    if model and event_encoder:
-        return model, event_encoder
+    """
+    Returns the active (model, event_encoder) from ml.registry. Cheap to call per
+    run or per chunk: the artifacts are loaded once and swapped in place when a new
+    version is published to ml/ml_cache.
+    """
+    global model, event_encoder, model_version
+    model, event_encoder, model_version = get_registry().get()
+    return model, event_encoder
 
-    with open(MODEL_PATH, "rb") as f:
-        model = pickle.load(f)
-    with open(EVENT_ENCODER_PATH, "rb") as f:
-        event_encoder = pickle.load(f)
 
-    return model, event_encoder
+# Max rows per IsolationForest call; bounds the feature matrix in memory
+SCORING_BATCH_SIZE = int(os.getenv("SCORING_BATCH_SIZE", 10000))
+
+# Column order of the feature matrix (matches the trained model's feature_names_in_)
+FEATURE_COLUMNS = ["hour", "event_encoded"]
+
+# Encoded value for events the encoder never saw
+UNKNOWN_EVENT_CODE = -1
+
+_event_lookups = {}
+
+
+def event_lookup(event_encoder):
+    """
+    Returns a precomputed {event: code} table for the encoder (built once per encoder).
+    """
+    key = id(event_encoder)
+    cached = _event_lookups.get(key)
+    if cached is None or cached[0] is not event_encoder:
+        cached = (event_encoder, {event: code for code, event in enumerate(event_encoder.classes_)})
+        _event_lookups[key] = cached
+    return cached[1]
+
+
+def model_feature_columns(model):
+    """
+    Returns the feature columns a fitted model expects, in order.
+    """
+    names = getattr(model, "feature_names_in_", None)
+    return list(names) if names is not None else list(FEATURE_COLUMNS)
+
+
+def _frame_values(frame, column):
+    # Object values with nulls as None, for per-event Python code
+    if column not in frame:
+        return [None] * len(frame)
+    values = frame[column]
+    return values.astype(object).where(values.notna(), None).to_numpy()
+
 
+def extract_feature_matrix(logs, event_encoder, columns=FEATURE_COLUMNS, tracker=None):
+    """
+    Builds a C-contiguous float64 matrix (rows x `columns`) without per-row encoder
+    calls or string parsing.
 
-def extract_features(logs, event_encoder):
-    rows = []
-    for log in logs:
-        ts = log.get("timestamp")
-        try:
-            hour = datetime.strptime(ts, "%Y-%m-%d %H:%M:%S").hour
-        except:
-            hour = 0
+    Accepts a list of LogRecords or a DataFrame with `ts` (epoch seconds) or raw
+    `timestamp` strings plus an `event` column (e.g. from the columnar cache).
 
-        event = log.get("event", "UNKNOWN_ACTIVITY")
+    Columns from ml.behavior.BEHAVIOR_COLUMNS are produced by feeding the logs, in
+    order, through `tracker`, so window state carries over between successive calls
+    given the same tracker (default: a new one, windows start empty).
+    """
+    lookup = event_lookup(event_encoder)
+    unknown_event = lookup.get("UNKNOWN_ACTIVITY", UNKNOWN_EVENT_CODE)
+    is_frame = isinstance(logs, pd.DataFrame)
+    n = len(logs)
 
-        event_enc = event_encoder.transform([event])[0] if event in event_encoder.classes_ else -1
+    if is_frame:
+        if "ts" in logs:
+            ts = logs["ts"].to_numpy(dtype=np.float64, na_value=np.nan)
+            hours = np.where(np.isnan(ts), 0, np.floor_divide(ts, 3600) % 24)
+        else:
+            parsed = pd.to_datetime(logs["timestamp"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+            ts = ((parsed - pd.Timestamp(0)) // pd.Timedelta(seconds=1)).to_numpy(dtype=np.float64, na_value=np.nan)
+            hours = parsed.dt.hour.fillna(0).to_numpy(dtype=np.float64)
+        events = _frame_values(logs, "event")
+    else:
+        ts = np.fromiter((-1 if log.ts is None else log.ts for log in logs), dtype=np.int64, count=n)
+        hours = np.where(ts < 0, 0, (ts // 3600) % 24)
+        events = [log.event for log in logs]
 
-        rows.append({
-            "hour": hour,
-            "event_encoded": event_enc
-        })
+    base = {
+        "hour": hours,
+        "event_encoded": np.fromiter(
+            (unknown_event if event is None else lookup.get(event, UNKNOWN_EVENT_CODE) for event in events),
+            dtype=np.float64, count=n
+        ),
+    }
 
-    return pd.DataFrame(rows)
+    behavior = None
+    if any(column in BEHAVIOR_COLUMNS for column in columns):
+        tracker = tracker or BehaviorTracker()
+        if is_frame:
+            behavior = tracker.update_many(
+                [None if t != t else int(t) for t in ts],
+                _frame_values(logs, "user"), _frame_values(logs, "ip"), _frame_values(logs, "endpoint"), events
+            )
+        else:
+            behavior = tracker.update_many(
+                [log.ts for log in logs], [log.user for log in logs], [log.ip for log in logs],
+                [log.endpoint for log in logs], events
+            )
 
+    matrix = np.empty((n, len(columns)), dtype=np.float64)
+    for j, column in enumerate(columns):
+        if column in base:
+            matrix[:, j] = base[column]
+        else:
+            matrix[:, j] = behavior[:, BEHAVIOR_COLUMNS.index(column)]
+    return matrix
+
+
+def extract_features(logs, event_encoder, columns=FEATURE_COLUMNS, tracker=None):
+    """
+    Returns the feature matrix as a DataFrame with the model's column names, as the
+    IsolationForest was fitted on named features.
+    """
+    matrix = extract_feature_matrix(logs, event_encoder, columns, tracker)
+    return pd.DataFrame(matrix, columns=columns, copy=False)
+
+
+def score_matrix(matrix, model, batch_size=SCORING_BATCH_SIZE):
+    """
+    Returns decision_function scores for a feature matrix laid out in
+    `model_feature_columns(model)` order, at most `batch_size` rows per call.
+    """
+    if len(matrix) == 0:
+        return np.empty(0)
+    columns = model_feature_columns(model)
+    return np.concatenate([
+        model.decision_function(pd.DataFrame(matrix[start:start + batch_size], columns=columns))
+        for start in range(0, len(matrix), batch_size)
+    ])
+
+
+def score_logs(logs, model, event_encoder, batch_size=SCORING_BATCH_SIZE, tracker=None):
+    """
+    Returns IsolationForest decision_function scores for `logs`, computed in fixed-size
+    batches so the feature matrix never exceeds `batch_size` rows.
+    Scores below 0 are what `model.predict` labels -1 (anomaly); lower = more anomalous.
+    Behavioral windows carry across the batches (and across calls given the same `tracker`).
+    """
+    if len(logs) == 0:
+        return np.empty(0)
+    tracker = tracker or BehaviorTracker()
+    columns = model_feature_columns(model)
+    scores = [
+        score_matrix(extract_feature_matrix(logs[start:start + batch_size], event_encoder, columns, tracker), model, batch_size)
+        for start in range(0, len(logs), batch_size)
+    ]
+    return np.concatenate(scores)
+
+
+def train_model(logs, columns=FEATURE_COLUMNS + BEHAVIOR_COLUMNS, **params):
+    """
+    Fits a LabelEncoder and IsolationForest on a list of LogRecords (in arrival order),
+    using the same feature extraction as scoring. Defaults mirror ml/train_model.ipynb.
+
+    Returns:
+    - (model, event_encoder)
+    """
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import LabelEncoder
+
+    event_encoder = LabelEncoder()
+    event_encoder.fit([log.event or "UNKNOWN_ACTIVITY" for log in logs] + ["UNKNOWN_ACTIVITY"])
+
+    X = extract_features(logs, event_encoder, columns, tracker=BehaviorTracker())
+    params = {"n_estimators": 50, "contamination": 0.05, "random_state": 42, **params}
+    model = IsolationForest(**params).fit(X)
+
+    return model, event_encoder
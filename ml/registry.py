@@ -0,0 +1,307 @@
+"""
+Versioned model artifacts with memory-mapped loading and hot reload.
+
+Layout under ml/ml_cache:
+    versions/<version>/model.joblib        IsolationForest
+    versions/<version>/event_encoder.joblib
+    versions/<version>/meta.json           free-form metadata (trained_at, rows, ...)
+    CURRENT                                name of the active version
+
+`publish_model` writes a new version directory and then swaps CURRENT with an
+atomic rename, so a reader sees either the old or the new version, never a mix.
+Without CURRENT, the original flat iforest_model.pkl / event_encoder.pkl pair is
+served as version "legacy".
+
+Usage (from the repo root):
+    python -m ml.registry                 # load every version, report load time and RSS
+    python -m ml.registry --publish NAME  # copy the active artifacts to a new version
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+MODEL_CACHE_DIR = Path(os.getenv("MODEL_CACHE_DIR", "ml/ml_cache"))
+
+# Seconds between checks of CURRENT for a newly published version (0 = check on every call)
+MODEL_POLL_SECONDS = float(os.getenv("MODEL_POLL_SECONDS", 5))
+
+LEGACY_VERSION = "legacy"
+LEGACY_MODEL_FILE = "iforest_model.pkl"
+LEGACY_ENCODER_FILE = "event_encoder.pkl"
+MODEL_FILE = "model.joblib"
+ENCODER_FILE = "event_encoder.joblib"
+META_FILE = "meta.json"
+CURRENT_FILE = "CURRENT"
+
+
+def resident_memory():
+    """
+    Current resident set size of this process in bytes (0 if unavailable).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # Peak rather than current RSS on platforms without /proc (kilobytes on Linux, bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+def current_version(cache_dir=MODEL_CACHE_DIR):
+    """
+    Returns the active version name from CURRENT, or "legacy" when nothing was published.
+    """
+    try:
+        version = (Path(cache_dir) / CURRENT_FILE).read_text().strip()
+    except FileNotFoundError:
+        return LEGACY_VERSION
+    return version or LEGACY_VERSION
+
+
+def list_versions(cache_dir=MODEL_CACHE_DIR):
+    cache_dir = Path(cache_dir)
+    versions = []
+    if (cache_dir / LEGACY_MODEL_FILE).exists():
+        versions.append(LEGACY_VERSION)
+    versions_dir = cache_dir / "versions"
+    if versions_dir.is_dir():
+        versions.extend(sorted(p.name for p in versions_dir.iterdir() if (p / MODEL_FILE).exists()))
+    return versions
+
+
+def _artifact_paths(version, cache_dir):
+    cache_dir = Path(cache_dir)
+    if version == LEGACY_VERSION:
+        return cache_dir / LEGACY_MODEL_FILE, cache_dir / LEGACY_ENCODER_FILE
+    version_dir = cache_dir / "versions" / version
+    return version_dir / MODEL_FILE, version_dir / ENCODER_FILE
+
+
+def load_version(version, cache_dir=MODEL_CACHE_DIR):
+    """
+    Loads one version's (model, event_encoder) and returns them with load stats.
+
+    Joblib artifacts are opened with mmap_mode="r": numpy arrays stored in them are
+    mapped read-only from the page cache rather than copied, so every process serving
+    the same version shares those pages. (scikit-learn copies tree node arrays into
+    its own buffers on unpickling; forked scoring workers share those copy-on-write.)
+    Legacy .pkl files are plain pickles and are loaded as such.
+    """
+    import joblib
+
+    model_path, encoder_path = _artifact_paths(version, cache_dir)
+    rss_before = resident_memory()
+    start = time.perf_counter()
+    mmap_mode = None if version == LEGACY_VERSION else "r"
+    model = joblib.load(model_path, mmap_mode=mmap_mode)
+    event_encoder = joblib.load(encoder_path, mmap_mode=mmap_mode)
+    elapsed = time.perf_counter() - start
+    rss_after = resident_memory()
+    stats = {
+        "version": version,
+        "load_seconds": elapsed,
+        "rss_bytes": rss_after,
+        "rss_delta_bytes": rss_after - rss_before,
+        "artifact_bytes": model_path.stat().st_size + encoder_path.stat().st_size,
+        "loaded_at": time.time(),
+    }
+    return model, event_encoder, stats
+
+
+def publish_model(model, event_encoder, version=None, metadata=None, cache_dir=MODEL_CACHE_DIR):
+    """
+    Saves a new model version and makes it the active one.
+
+    Artifacts are written to a temporary directory that is renamed into
+    versions/<version> once complete; CURRENT is then replaced atomically. Running
+    services pick the new version up on their next poll.
+
+    Returns:
+    - the version name (default: UTC timestamp)
+    """
+    import joblib
+
+    cache_dir = Path(cache_dir)
+    version = version or time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    versions_dir = cache_dir / "versions"
+    versions_dir.mkdir(parents=True, exist_ok=True)
+    target = versions_dir / version
+    if version == LEGACY_VERSION or target.exists():
+        raise ValueError(f"Model version already exists: {version}")
+
+    staging = Path(tempfile.mkdtemp(prefix=f".{version}.", dir=versions_dir))
+    try:
+        joblib.dump(model, staging / MODEL_FILE)
+        joblib.dump(event_encoder, staging / ENCODER_FILE)
+        meta = {"version": version, "published_at": time.time(), **(metadata or {})}
+        (staging / META_FILE).write_text(json.dumps(meta, indent=2))
+        os.replace(staging, target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    tmp_path = cache_dir / f"{CURRENT_FILE}.tmp"
+    tmp_path.write_text(version + "\n")
+    os.replace(tmp_path, cache_dir / CURRENT_FILE)
+    return version
+
+
+class ModelRegistry:
+    """
+    Serves the active model version and hot-swaps it when CURRENT changes.
+
+    `get()` stats CURRENT at most every `poll_interval` seconds; when a new version
+    is published it is fully loaded first and then swapped in under a lock, so
+    callers always receive a consistent (model, encoder, version) triple and
+    in-flight scoring keeps using the objects it already holds. A version that
+    fails to load is reported and the previous one keeps serving.
+    """
+
+    def __init__(self, cache_dir=MODEL_CACHE_DIR, poll_interval=MODEL_POLL_SECONDS):
+        self.cache_dir = Path(cache_dir)
+        self.poll_interval = poll_interval
+        self.stats = {}  # version -> load stats
+        self._active = None  # (model, event_encoder, version)
+        self._pinned = {}  # version -> (model, event_encoder, version), for workers asked for a specific version
+        self._lock = threading.Lock()
+        self._current_mtime = None
+        self._next_check = 0.0
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def get(self, version=None):
+        """
+        Returns (model, event_encoder, version). With `version`, returns that exact
+        version (loading it if needed) so pool workers match the parent's model.
+        """
+        if version is not None:
+            active = self._active
+            if active is not None and active[2] == version:
+                return active
+            return self._get_pinned(version)
+
+        if self._active is None or time.monotonic() >= self._next_check:
+            self.refresh()
+        return self._active
+
+    def refresh(self):
+        """
+        Re-reads CURRENT and swaps in the version it names if it changed.
+        Returns True when a new version was activated.
+        """
+        self._next_check = time.monotonic() + self.poll_interval
+        try:
+            mtime = (self.cache_dir / CURRENT_FILE).stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if self._active is not None and mtime == self._current_mtime:
+            return False
+
+        with self._lock:
+            version = current_version(self.cache_dir)
+            if self._active is not None and self._active[2] == version:
+                self._current_mtime = mtime
+                return False
+            try:
+                loaded = self._load(version)
+            except Exception as e:
+                if self._active is None:
+                    raise
+                print(f"[Model Registry] Failed to load version {version}, keeping {self._active[2]}: {e}")
+                self._current_mtime = mtime
+                return False
+            previous = self._active
+            self._active = loaded
+            self._current_mtime = mtime
+            # Runs that pinned the outgoing version keep using it without a reload
+            self._pinned = {previous[2]: previous} if previous is not None else {}
+        if previous is not None:
+            print(f"[Model Registry] Swapped model {previous[2]} -> {version}")
+        return True
+
+    def _get_pinned(self, version):
+        with self._lock:
+            pinned = self._pinned.get(version)
+            if pinned is None:
+                # Only the most recent pinned version is kept
+                self._pinned = {version: self._load(version)}
+                pinned = self._pinned[version]
+            return pinned
+
+    def _load(self, version):
+        model, event_encoder, stats = load_version(version, self.cache_dir)
+        self.stats[version] = stats
+        print(f"[Model Registry] Loaded model {version} in {stats['load_seconds'] * 1000:.1f} ms, "
+              f"RSS {stats['rss_bytes'] / 2**20:.1f} MiB (+{stats['rss_delta_bytes'] / 2**20:.1f} MiB)")
+        return model, event_encoder, version
+
+    def watch(self, interval=None):
+        """
+        Starts a daemon thread that polls CURRENT, so a long-running service swaps
+        versions even while idle. Safe to call more than once.
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return self._watcher
+        interval = self.poll_interval if interval is None else interval
+        self._stop.clear()
+
+        def _run():
+            while not self._stop.wait(max(interval, 0.1)):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"[Model Registry] Watch error: {e}")
+
+        self._watcher = threading.Thread(target=_run, name="model-registry-watch", daemon=True)
+        self._watcher.start()
+        return self._watcher
+
+    def stop(self):
+        self._stop.set()
+
+
+_registry = None
+
+
+def get_registry():
+    """
+    Process-wide registry. Forked scoring workers inherit the loaded model.
+    """
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry()
+    return _registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cache-dir", default=str(MODEL_CACHE_DIR))
+    parser.add_argument("--publish", metavar="NAME", help="Publish the active artifacts as a new version NAME")
+    args = parser.parse_args()
+
+    if args.publish:
+        model, event_encoder, stats = load_version(current_version(args.cache_dir), args.cache_dir)
+        version = publish_model(model, event_encoder, args.publish, {"copied_from": stats["version"]}, args.cache_dir)
+        print(f"Published {version}")
+        return
+
+    active = current_version(args.cache_dir)
+    print(f"{'version':<24} {'load ms':>9} {'RSS MiB':>9} {'+RSS MiB':>9} {'size KiB':>9}")
+    for version in list_versions(args.cache_dir):
+        _, _, stats = load_version(version, args.cache_dir)
+        marker = " *" if version == active else ""
+        print(f"{version:<24} {stats['load_seconds'] * 1000:>9.1f} {stats['rss_bytes'] / 2**20:>9.1f} "
+              f"{stats['rss_delta_bytes'] / 2**20:>9.1f} {stats['artifact_bytes'] / 1024:>9.1f}{marker}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import atexit
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from ml.model import load_model_and_encoders, extract_feature_matrix, model_feature_columns, score_logs, score_matrix
+from ml.registry import get_registry
+
+# Processes used for scoring (1 = score in-process)
+DETECTOR_WORKERS = int(os.getenv("DETECTOR_WORKERS", 1))
+
+# Max rows per shard sent to a worker; large inputs are split into shards of this size
+SHARD_SIZE = int(os.getenv("DETECTOR_SHARD_SIZE", 20000))
+
+# Inputs smaller than this are scored in-process; IPC would cost more than it saves
+MIN_SHARD_SIZE = int(os.getenv("DETECTOR_MIN_SHARD_SIZE", 1000))
+
+_pool = None
+_pool_workers = 0
+
+
+def _init_worker():
+    # Forked workers inherit the parent's loaded model; spawned ones load it once here
+    load_model_and_encoders()
+
+
+def _score_shard(matrix, version):
+    # Score with the parent's version even if a newer one was published mid-run
+    model, _, _ = get_registry().get(version)
+    return score_matrix(matrix, model)
+
+
+def get_scoring_pool(workers=DETECTOR_WORKERS):
+    """
+    Returns a process pool kept alive across chunks and runs, so workers load the
+    model once per process rather than once per call.
+    """
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        shutdown_scoring_pool()
+        _pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        _pool_workers = workers
+    return _pool
+
+
+def shutdown_scoring_pool():
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+        _pool_workers = 0
+
+
+atexit.register(shutdown_scoring_pool)
+
+
+def score_logs_sharded(logs, workers=DETECTOR_WORKERS, shard_size=SHARD_SIZE, version=None, tracker=None):
+    """
+    Scores `logs` (LogRecords or a detection DataFrame) across a process pool and returns
+    decision_function scores in input order.
+
+    The parent builds the (vectorized, cheap) feature matrix and ships contiguous float
+    shards to the workers, which run the tree ensemble, the expensive part. Shipping
+    matrix rows instead of records keeps IPC to a memcpy-sized pickle per shard.
+
+    Shards are at most `shard_size` rows, and smaller inputs are split evenly across
+    the workers. Falls back to in-process scoring for one worker or tiny inputs.
+    `version` pins a model version (default: the active one); `tracker` carries
+    behavioral windows across calls (ml.model.score_logs).
+    """
+    model, event_encoder, version = get_registry().get(version)
+    if workers <= 1 or len(logs) < 2 * MIN_SHARD_SIZE:
+        return score_logs(logs, model, event_encoder, tracker=tracker)
+
+    # Built in the parent: behavioral window features depend on event order across shards
+    matrix = extract_feature_matrix(logs, event_encoder, model_feature_columns(model), tracker)
+    shard_size = max(MIN_SHARD_SIZE, min(shard_size, -(-len(logs) // workers)))
+    shards = [matrix[start:start + shard_size] for start in range(0, len(matrix), shard_size)]
+    # executor.map yields results in submission order, so scores line up with `logs`
+    return np.concatenate(list(get_scoring_pool(workers).map(_score_shard, shards, [version] * len(shards))))
@@ -0,0 +1,206 @@
+import json
+import os
+from collections import defaultdict
+from pathlib import Path
+from ml.behavior import DetectionWindows
+
+# Deterministic detection rules applied before the IsolationForest
+RULES_PATH = Path(os.getenv("DETECTION_RULES_PATH", "rules/detection_rules.json"))
+
+GROUP_BY_FIELDS = ("user", "ip", "endpoint")
+
+
+class _LogFields(dict):
+    # Missing or empty placeholders in rule summaries render as "unknown"
+    def __missing__(self, key):
+        return "unknown"
+
+
+class Rule:
+    """
+    One compiled detection rule.
+
+    Conditions (all optional, at least one required):
+    - event: list of event names
+    - endpoint: list of endpoints
+    - hours: list of [start, end) hour ranges in log time, e.g. [[0, 9], [18, 24]]
+    - group_by + min_count + window_seconds: match once `min_count` events that
+      satisfy the other conditions share the same user/ip/endpoint within the window
+    """
+
+    __slots__ = ("id", "order", "threat_type", "events", "endpoints", "hours", "group_by", "min_count",
+                 "window", "affected_system", "risk_score", "summary", "impact")
+
+    def __init__(self, spec, order):
+        self.id = spec["id"]
+        self.order = order
+        self.threat_type = spec["threat_type"]
+        self.events = frozenset(spec.get("event", ()))
+        self.endpoints = frozenset(spec.get("endpoint", ()))
+        self.hours = None
+        if spec.get("hours"):
+            self.hours = frozenset(h for start, end in spec["hours"] for h in range(start, end))
+        self.group_by = spec.get("group_by")
+        self.min_count = int(spec.get("min_count", 1))
+        self.window = None
+        if self.min_count > 1:
+            if self.group_by not in GROUP_BY_FIELDS:
+                raise ValueError(f"Rule {self.id}: min_count needs group_by in {GROUP_BY_FIELDS}")
+            self.window = int(spec.get("window_seconds", 300))
+        if not (self.events or self.endpoints or self.hours):
+            raise ValueError(f"Rule {self.id}: needs at least one of event, endpoint or hours")
+        self.affected_system = spec.get("affected_system")
+        self.risk_score = spec.get("risk_score", 5)
+        self.summary = spec.get("summary", "")
+        self.impact = spec.get("impact", "Unknown")
+
+    def accepts(self, ts, hour, user, ip, endpoint, event, windows):
+        """
+        Checks the remaining conditions for a candidate log and updates its burst
+        count in `windows` (DetectionWindows).
+        """
+        if self.events and event not in self.events:
+            return False
+        if self.endpoints and endpoint not in self.endpoints:
+            return False
+        if self.hours is not None and hour not in self.hours:
+            return False
+        if self.window is None:
+            return True
+        key = user if self.group_by == "user" else ip if self.group_by == "ip" else endpoint
+        if key is None or ts is None:
+            return False
+        return windows.rule_counter(self.id, self.window).add(key, ts) >= self.min_count
+
+    def describe(self, record):
+        """
+        Renders the rule's summary template with the record's fields.
+        """
+        fields = _LogFields((k, v) for k, v in record.to_dict().items() if v != "")
+        return self.summary.format_map(fields)
+
+
+class RuleEngine:
+    """
+    Rules compiled into hash indexes so a log is only checked against rules that
+    can match it.
+
+    Each rule is indexed under its most selective condition: endpoint if set, else
+    event, else its hours. A log looks up its endpoint, event and hour (O(1) each)
+    and evaluates just those candidates; every candidate is evaluated so burst
+    counts stay exact, and the first matching rule in config order wins.
+
+    The engine itself is stateless: burst counts live in a DetectionWindows passed
+    to each call, fresh per call unless the caller carries one across calls.
+    """
+
+    def __init__(self, specs=()):
+        self.rules = {}
+        self._by_endpoint = defaultdict(list)
+        self._by_event = defaultdict(list)
+        self._by_hour = [[] for _ in range(24)]
+        for order, spec in enumerate(specs):
+            rule = Rule(spec, order)
+            if rule.id in self.rules:
+                raise ValueError(f"Duplicate rule id: {rule.id}")
+            self.rules[rule.id] = rule
+            if rule.endpoints:
+                for endpoint in rule.endpoints:
+                    self._by_endpoint[endpoint].append(rule)
+            elif rule.events:
+                for event in rule.events:
+                    self._by_event[event].append(rule)
+            else:
+                for hour in rule.hours:
+                    self._by_hour[hour].append(rule)
+
+    @classmethod
+    def from_file(cls, path=RULES_PATH):
+        with open(path, "r") as f:
+            return cls(json.load(f))
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self, ts, user, ip, endpoint, event, windows):
+        """
+        Returns the first matching Rule for one log, or None.
+        """
+        hour = (ts // 3600) % 24 if ts is not None else None
+        matched = None
+        for candidates in (
+            self._by_endpoint.get(endpoint, ()),
+            self._by_event.get(event, ()),
+            self._by_hour[hour] if hour is not None else (),
+        ):
+            for rule in candidates:
+                if rule.accepts(ts, hour, user, ip, endpoint, event, windows) and (matched is None or rule.order < matched.order):
+                    matched = rule
+        return matched
+
+    def match_columns(self, ts, users, ips, endpoints, events, windows=None):
+        """
+        Matches parallel column sequences (in arrival order); returns a Rule or None per row.
+        """
+        if windows is None:
+            windows = DetectionWindows()
+        match = self.match
+        return [match(*row, windows) for row in zip(ts, users, ips, endpoints, events)]
+
+    def split(self, records, windows=None):
+        """
+        Splits LogRecords into (matched, unmatched), preserving order. Matched records
+        are tagged with `threat_type` and `rule`. Burst counts start empty unless
+        `windows` carries them over from earlier calls.
+        """
+        if windows is None:
+            windows = DetectionWindows()
+        matched, unmatched = [], []
+        match = self.match
+        for record in records:
+            rule = match(record.ts, record.user, record.ip, record.endpoint, record.event, windows)
+            if rule is None:
+                unmatched.append(record)
+            else:
+                record.threat_type = rule.threat_type
+                record.rule = rule.id
+                matched.append(record)
+        return matched, unmatched
+
+    def split_frame(self, frame, windows=None):
+        """
+        Matches a detection DataFrame (ts/user/ip/endpoint/event columns), with burst
+        counts in `windows` as in `split`.
+
+        Returns:
+        - (matched row indices, their Rules, unmatched row indices)
+        """
+        def column(name):
+            values = frame[name]
+            return values.astype(object).where(values.notna(), None).tolist()
+
+        ts = [None if t is None else int(t) for t in column("ts")]
+        rules = self.match_columns(ts, column("user"), column("ip"), column("endpoint"), column("event"), windows)
+        matched = [i for i, rule in enumerate(rules) if rule is not None]
+        unmatched = [i for i, rule in enumerate(rules) if rule is None]
+        return matched, [rules[i] for i in matched], unmatched
+
+
+_engine = None
+_engine_mtime = None
+
+
+def get_rule_engine(path=RULES_PATH):
+    """
+    Process-wide engine, recompiled when the rules file changes. A missing rules
+    file yields an empty engine.
+    """
+    global _engine, _engine_mtime
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    if _engine is None or mtime != _engine_mtime:
+        _engine = RuleEngine.from_file(path) if mtime is not None else RuleEngine()
+        _engine_mtime = mtime
+    return _engine
@@ -1,14 +1,33 @@
-from typing import TypedDict, List, Dict
+import operator
+from typing import Annotated, TypedDict, List, Dict, Optional, Union
+from ingestion.record import LogRecord
+from ml.behavior import DetectionWindows
 
 class State(TypedDict):
     # Input (loaded at start)
-    logs: List[Dict]                # Raw logs from mobile/PLP systems
+    logs: List[Union[LogRecord, Dict]]  # Normalized logs from mobile/PLP systems; LogGroups after `coalesce`, incident dicts after `context`
+    log_source: Optional[Dict]      # Streaming source spec (data_dir, chunk_size, paths); used instead of `logs` when set
     accessed_by: str                # Analyst email or ID (e.g. "l3_analyst@bank.co.in")
     user_role: str                  # Analyst's role (e.g. "L1", "L3", "Admin")
+    windows: Optional[DetectionWindows]  # Burst/behavioral window state carried across runs (follow mode); fresh per run when unset
+
+    # rules
+    rule_matches: List[LogRecord]   # Logs tagged by a deterministic rule; skip the model and LLM classification
 
     # audit_control
     audit_log: Dict                # Contains audit entry + SHA-256 hash
     rbac_passed: bool              # Whether response agent is allowed to proceed
 
     # File name
-    report_filename: str
\ No newline at end of file
+    report_filename: str
+
+    # partitioned flow
+    partition_incidents: Annotated[List[Dict], operator.add]  # Incidents of every partition, concatenated as they finish
+
+
+class PartitionState(TypedDict):
+    # Input of one partition in the partitioned flow (sent with langgraph's Send)
+    partition: str                  # Partition key (source file, time window or user hash bucket)
+    logs: List[LogRecord]           # The partition's logs no rule matched
+    rule_matches: List[LogRecord]   # The partition's rule-tagged logs
+    rbac_passed: bool               # Whether recommendations are generated for the partition
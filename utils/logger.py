@@ -2,9 +2,10 @@ import json
 import os
 from datetime import datetime
 
-LOG_FILE = "audit_logs/log.jsonl"
+# Overridable so benchmarks and tests don't append to the real audit trail
+LOG_FILE = os.getenv("AUDIT_LOG_FILE", "audit_logs/log.jsonl")
 
-os.makedirs("audit_logs", exist_ok=True)
+os.makedirs(os.path.dirname(LOG_FILE) or ".", exist_ok=True)
 
 def append_audit_log(entry: dict, hash_value: str):
     """